@@ -0,0 +1,252 @@
+import argparse
+import gc
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable, Iterator
+
+from city import City, get_city_by_id, get_distance_matrix
+from vehicles import Vehicle, create_vehicle
+from csv_parsing import create_cities_countries_from_csv
+from path_finding import find_shortest_path, prepare_search
+import stats
+
+# number of queries sent to a worker at once
+QUERIES_PER_TASK = 64
+
+# the vehicles created by the current process, by their JSON description
+vehicles_by_spec = dict()
+
+
+def get_vehicle(spec: dict) -> Vehicle:
+    """
+    Returns the vehicle described by a query, creating it the first time it is seen.
+
+    :param spec: the description of the vehicle (see create_vehicle).
+    :return: the vehicle.
+    """
+    key = json.dumps(spec, sort_keys=True)
+    vehicle = vehicles_by_spec.get(key)
+    if vehicle is None:
+        vehicle = create_vehicle(spec)
+        vehicles_by_spec[key] = vehicle
+    return vehicle
+
+
+def route_query(query: dict) -> dict:
+    """
+    Finds the shortest path of a query of the form
+    {"vehicle": {"type": ..., ...}, "from": city ID, "to": city ID}.
+
+    A query that could not be read (see read_queries) is returned as it is.
+
+    :param query: the query.
+    :return: the query, along with the travel time in hours and the city IDs of the path
+             (both None if there is no path), or with an error message.
+    """
+    if not isinstance(query, dict):
+        return {"query": query, "error": "a query must be a JSON object"}
+    result = dict(query)
+    if "error" in query:
+        return result
+
+    try:
+        vehicle = get_vehicle(query["vehicle"])
+        from_city = get_city_by_id(query["from"])
+        to_city = get_city_by_id(query["to"])
+        if from_city is None or to_city is None:
+            raise ValueError("unknown city ID")
+    except (KeyError, TypeError, ValueError) as error:
+        result["error"] = str(error)
+        return result
+
+    # a failing query must not stop the other queries of the batch
+    try:
+        shortest_path = find_shortest_path(vehicle, from_city, to_city)
+        if shortest_path is None:
+            result["hours"], result["path"] = None, None
+        else:
+            hours = vehicle.compute_itinerary_time(shortest_path)
+            result["hours"] = None if hours == math.inf else hours
+            result["path"] = [city.city_id for city in shortest_path.cities]
+    except Exception as error:
+        result.pop("hours", None)
+        result.pop("path", None)
+        result["error"] = f"{type(error).__name__}: {error}"
+
+    return result
+
+
+def route_queries(queries: list[dict]) -> list[str]:
+    """
+    Finds the shortest paths of some queries (see route_query). Runs in the workers.
+
+    :param queries: the queries.
+    :return: the results, as JSON lines.
+    """
+    return [json.dumps(route_query(query)) + "\n" for query in queries]
+
+
+def load_worker_data(path_to_csv: str) -> None:
+    """
+    Creates the cities of the CSV file in a worker, unless they were inherited
+    from the parent process.
+
+    :param path_to_csv: the path to the CSV file.
+    :return: None
+    """
+    if not City.id_to_cities:
+        create_cities_countries_from_csv(path_to_csv)
+
+
+def read_queries(lines: Iterable[str]) -> list[dict]:
+    """
+    Reads the queries of a JSON lines file, skipping empty lines.
+    A line that is not valid JSON gives an error result instead of a query,
+    so that the results stay in the order of the lines.
+
+    :param lines: the lines of the file.
+    :return: the queries.
+    """
+    queries = []
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            queries.append(json.loads(line))
+        except ValueError as error:
+            queries.append({"line": number, "error": f"invalid JSON: {error}"})
+    return queries
+
+
+def prepare_queries(queries: list[dict]) -> None:
+    """
+    Builds the data used by the queries (the distance matrix, and the graph or the router
+    of each vehicle), so that it is built once in the parent process instead of once in each worker.
+
+    :param queries: the queries.
+    :return: None
+    """
+    get_distance_matrix()
+
+    for query in queries:
+        try:
+            vehicle = get_vehicle(query["vehicle"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        prepare_search(vehicle)
+
+
+def run_batch(
+    queries: list[dict], path_to_csv: str, workers: int, queries_per_task: int
+) -> Iterator[str]:
+    """
+    Finds the shortest paths of the queries with a pool of processes.
+    The cities and the graphs of the parent process are shared with the workers
+    when processes are forked, the workers load them otherwise.
+    The statistics of the workers (see stats.py) are added to the ones of the parent process.
+
+    :param queries: the queries.
+    :param path_to_csv: the path to the CSV file the cities were read from.
+    :param workers: the number of processes.
+    :param queries_per_task: the number of queries sent to a worker at once.
+    :return: the results as JSON lines, in the order of the queries.
+    """
+    tasks = [
+        queries[start : start + queries_per_task]
+        for start in range(0, len(queries), queries_per_task)
+    ]
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        # objects left out of garbage collection are not written to by it,
+        # so the memory pages of the shared data stay shared with the workers
+        gc.freeze()
+    else:
+        context = multiprocessing.get_context()
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=load_worker_data,
+            initargs=(path_to_csv,),
+        ) as executor:
+            for lines, statistics in executor.map(
+                stats.call_collecting, repeat(route_queries), tasks
+            ):
+                stats.merge(statistics)
+                yield from lines
+    finally:
+        # the workers are gone, the objects can be collected again
+        gc.unfreeze()
+
+
+def run_queries(options: argparse.Namespace) -> None:
+    """
+    Finds the shortest paths of the queries given on the command line (see main).
+
+    :param options: the parsed command line arguments.
+    :return: None
+    """
+    start = time.perf_counter()
+    create_cities_countries_from_csv(options.csv)
+    if options.queries is None:
+        queries = read_queries(sys.stdin)
+    else:
+        with open(options.queries) as file:
+            queries = read_queries(file)
+    prepare_queries(queries)
+    ready = time.perf_counter()
+
+    output = sys.stdout if options.output is None else open(options.output, "w")
+    try:
+        for line in run_batch(queries, options.csv, options.workers, options.queries_per_task):
+            output.write(line)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    end = time.perf_counter()
+    print(
+        f"{len(queries)} queries with {options.workers} workers:"
+        f" data ready in {ready - start:.2f} s,"
+        f" {len(queries) / max(end - ready, 1e-9):.0f} queries/s",
+        file=sys.stderr,
+    )
+
+
+def main(arguments: list[str] = None) -> None:
+    """
+    Reads queries from a JSON lines file (or the standard input) and writes their
+    results as JSON lines, e.g.
+    {"vehicle": {"type": "CrappyCrepeCar", "speed": 200}, "from": 1036533631, "to": 1036142029}
+
+    :param arguments: the command line arguments, sys.argv by default.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(
+        description="Finds the shortest paths of many (vehicle, from, to) queries in parallel."
+    )
+    parser.add_argument("queries", nargs="?", help="the JSON lines file of queries (default: stdin)")
+    parser.add_argument("-o", "--output", help="the JSON lines file of results (default: stdout)")
+    parser.add_argument("--csv", default="worldcities_truncated.csv", help="the CSV file of cities")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="the number of processes")
+    parser.add_argument(
+        "--queries-per-task",
+        type=int,
+        default=QUERIES_PER_TASK,
+        help="the number of queries sent to a worker at once",
+    )
+    stats.add_arguments(parser)
+    options = parser.parse_args(arguments)
+    stats.run(options, run_queries, options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,504 @@
+import argparse
+import csv
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+import stats
+
+# the directory where the synthetic worlds are written
+WORLDS_DIRECTORY = "benchmark_worlds"
+
+# the number of cities of the synthetic worlds benchmarked by default
+DEFAULT_SIZES = [1000, 10000, 100000]
+
+# the number of countries of every synthetic world
+COUNTRY_COUNT = 200
+
+# the share of the cities of each type, besides the one primary city of each country
+CITY_TYPE_SHARES = [("admin", 0.08), ("minor", 0.4), ("", 0.52)]
+
+# above this number of cities, the graph of the Trolley takes too long to build and
+# the A* searches of the Car too long to run, so only hierarchical vehicles (the Dinghy,
+# whose router only depends on the primary cities) are benchmarked
+PATH_FINDING_MAX_CITIES = 1000
+
+# the old names of renamed measures, so that they are still compared to older baselines
+RENAMED_MEASURES = {"prepare_search_": "build_graph_"}
+
+# the number of shortest paths searched for each vehicle
+PATH_QUERIES = 20
+
+# the number of cities inserted in an itinerary with min_distance_insert_city
+INSERTED_CITIES = 1000
+
+# the numbers of synthetic cities added to the registries with --registry-scaling
+REGISTRY_SCALING_SIZES = [10000, 100000, 1000000]
+
+# the registries fail the scaling check if the time per city grows more than this
+# from the smallest to the largest size (it would grow about 100x if quadratic)
+MAX_REGISTRY_GROWTH = 5
+
+# the number of maps drawn by each renderer
+PLOTTED_ITINERARIES = 5
+
+# a result more than this fraction slower than the baseline is a regression
+REGRESSION_TOLERANCE = 0.25
+
+# the syllables of the names of the synthetic cities
+SYLLABLES = ["ka", "lo", "mi", "ra", "sen", "tu", "vo", "bel", "dar", "en", "is", "gor", "pa", "zu"]
+
+# the columns of the CSV files of cities
+CSV_HEADER = [
+    "city",
+    "city_ascii",
+    "lat",
+    "lng",
+    "country",
+    "iso2",
+    "iso3",
+    "admin_name",
+    "capital",
+    "population",
+    "id",
+]
+
+
+def synthetic_name(generator: random.Random) -> str:
+    """
+    Returns a random name made of 2 or 3 syllables.
+
+    :param generator: the random number generator.
+    :return: the name.
+    """
+    return "".join(generator.choice(SYLLABLES) for _ in range(generator.randint(2, 3))).title()
+
+
+def generate_world(path: str, city_count: int, seed: int = 0) -> None:
+    """
+    Writes a CSV file of synthetic cities, with the same columns as worldcities_truncated.csv.
+    The cities of each country are spread around its center, each country has one primary city
+    and the other cities follow CITY_TYPE_SHARES. The same arguments always give the same file.
+
+    :param path: the path of the CSV file.
+    :param city_count: the number of cities.
+    :param seed: the seed of the random number generator.
+    :return: None
+    """
+    generator = random.Random(f"{seed}-{city_count}")
+
+    countries = []
+    for index in range(COUNTRY_COUNT):
+        iso3 = "".join(chr(ord("A") + (index // 26**power) % 26) for power in (2, 1, 0))
+        countries.append(
+            {
+                "name": "Country " + synthetic_name(generator) + " " + str(index),
+                "iso3": iso3,
+                # uniform on the sphere, without the poles
+                "lat": math.degrees(math.asin(generator.uniform(-0.85, 0.95))),
+                "lng": generator.uniform(-180, 180),
+                "radius": generator.uniform(1, 8),
+            }
+        )
+
+    types, weights = zip(*CITY_TYPE_SHARES)
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for index in range(city_count):
+            country = countries[index % COUNTRY_COUNT]
+            if index < COUNTRY_COUNT:
+                city_type = "primary"
+            else:
+                city_type = generator.choices(types, weights)[0]
+
+            latitude = min(max(generator.gauss(country["lat"], country["radius"]), -89), 89)
+            longitude = (generator.gauss(country["lng"], country["radius"]) + 180) % 360 - 180
+            population = int(generator.lognormvariate(11, 1.5))
+            if city_type == "primary":
+                population *= 10
+
+            name = synthetic_name(generator)
+            writer.writerow(
+                [
+                    name,
+                    name,
+                    f"{latitude:.4f}",
+                    f"{longitude:.4f}",
+                    country["name"],
+                    country["iso3"][:2],
+                    country["iso3"],
+                    "",
+                    city_type,
+                    population,
+                    2000000000 + index,
+                ]
+            )
+
+
+def time_call(function: Callable, repeat: int = 1) -> float:
+    """
+    Calls a function several times.
+
+    :param function: the function, called without arguments.
+    :param repeat: the number of calls.
+    :return: the median duration of a call in seconds.
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return statistics.median(durations)
+
+
+def run_world_benchmarks(path: str, path_finding_max_cities: int) -> dict[str, float]:
+    """
+    Times the main operations on the cities of a CSV file. The registries must be empty,
+    so it runs in its own process (see run_in_subprocess).
+
+    :param path: the path of the CSV file.
+    :param path_finding_max_cities: above this number of cities, no shortest path is searched.
+    :return: associates the name of each measure to a duration in seconds.
+    """
+    from city import City, get_city_by_id, get_cities_by_name
+    from country import Country, find_country_of_city
+    from csv_parsing import create_cities_countries_from_csv
+    from itinerary import Itinerary
+    from vehicles import create_example_vehicles
+
+    results = dict()
+    generator = random.Random(0)
+
+    results["load_csv_s"] = time_call(lambda: create_cities_countries_from_csv(path))
+    cities = list(City.id_to_cities.values())
+    names = [city.name for city in cities]
+    countries = list(Country.name_to_countries.values())
+
+    # the registry lookups, per city
+    results["lookup_by_id_per_city_s"] = time_call(
+        lambda: [get_city_by_id(city.city_id) for city in cities], repeat=3
+    ) / len(cities)
+    results["lookup_by_name_per_city_s"] = time_call(
+        lambda: [get_cities_by_name(name) for name in names], repeat=3
+    ) / len(cities)
+    results["country_of_city_per_city_s"] = time_call(
+        lambda: [find_country_of_city(city) for city in cities], repeat=3
+    ) / len(cities)
+    results["country_cities_by_type_per_country_s"] = time_call(
+        lambda: [country.get_cities(["primary", "admin"]) for country in countries], repeat=3
+    ) / len(countries)
+
+    from path_finding import find_shortest_path, prepare_search
+
+    pairs = [tuple(generator.sample(cities, 2)) for _ in range(PATH_QUERIES)]
+    for vehicle in create_example_vehicles():
+        name = type(vehicle).__name__
+        if len(cities) > path_finding_max_cities and not vehicle.hierarchical:
+            continue
+        if not vehicle.complete_graph:
+            results[f"prepare_search_{name}_s"] = time_call(lambda: prepare_search(vehicle))
+        results[f"shortest_path_{name}_per_query_s"] = time_call(
+            lambda: [find_shortest_path(vehicle, *pair) for pair in pairs]
+        ) / len(pairs)
+
+    # the time per insertion grows with the length of the itinerary
+    inserted = generator.sample(cities, min(INSERTED_CITIES, len(cities)))
+    itinerary = Itinerary([])
+    for count, checkpoint in ((len(inserted) // 2, "first_half"), (len(inserted), "second_half")):
+        start = time.perf_counter()
+        first = len(itinerary.cities)
+        for city in inserted[first:count]:
+            itinerary.min_distance_insert_city(city)
+        results[f"insert_city_{checkpoint}_per_city_s"] = (time.perf_counter() - start) / max(
+            count - first, 1
+        )
+
+    return results
+
+
+def run_registry_benchmarks(sizes: list[int]) -> dict[str, float]:
+    """
+    Adds growing numbers of synthetic cities (with repeated names) to synthetic countries,
+    and times the filling of the registries per city, which should not grow with the number
+    of cities. The registries must be empty, so it runs in its own process.
+
+    :param sizes: the numbers of cities to add, in increasing order.
+    :return: associates the name of each measure to a duration in seconds.
+    """
+    from city import City
+    from country import add_city_to_country
+
+    # ids far from the ones of real cities, and different for each size
+    first_id = 9000000000
+
+    results = dict()
+    for size in sizes:
+        start = time.perf_counter()
+        for index in range(size):
+            city = City(
+                "Synthetic " + str(index % 1000),
+                (index % 180 - 90, index % 360 - 180),
+                "admin",
+                index,
+                first_id + index,
+            )
+            add_city_to_country(city, "Synthetic " + str(index % 200), "SYN")
+        results[f"registry_fill_{size}_per_city_s"] = (time.perf_counter() - start) / size
+        first_id += size
+
+    return results
+
+
+def run_plotting_benchmarks() -> dict[str, float]:
+    """
+    Times the drawing of maps of itineraries of the cities of worldcities_truncated.csv,
+    with each renderer that can be used.
+
+    :return: associates the name of each measure to a duration in seconds.
+    """
+    from city import City
+    from csv_parsing import create_cities_countries_from_csv
+    from itinerary import Itinerary
+    import map_plotting
+
+    create_cities_countries_from_csv("worldcities_truncated.csv")
+    cities = list(City.id_to_cities.values())
+    generator = random.Random(0)
+    itineraries = [
+        Itinerary(generator.sample(cities, generator.randint(2, 5)))
+        for _ in range(PLOTTED_ITINERARIES)
+    ]
+
+    results = dict()
+    with tempfile.TemporaryDirectory() as directory:
+        for name in map_plotting.RENDERERS:
+            try:
+                start = time.perf_counter()
+                renderer = map_plotting.get_renderer(name)
+            except ImportError:
+                # Basemap is not installed
+                continue
+            results[f"plot_setup_{name}_s"] = time.perf_counter() - start
+
+            paths = [os.path.join(directory, f"{index}.png") for index in range(len(itineraries))]
+            results[f"plot_itinerary_{name}_per_map_s"] = time_call(
+                lambda: [
+                    renderer.render(itinerary, filename=path)
+                    for itinerary, path in zip(itineraries, paths)
+                ]
+            ) / len(itineraries)
+
+    return results
+
+
+def run_in_subprocess(arguments: list[str]) -> dict[str, float]:
+    """
+    Runs some benchmarks in a new Python process, so that they start with empty registries.
+
+    :param arguments: the arguments of benchmarks.py selecting the benchmarks.
+    :return: the results printed by the process.
+    """
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__)] + arguments,
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+    # e.g. the statistics of the hot paths, with --stats
+    sys.stderr.write(process.stderr)
+    return json.loads(process.stdout)
+
+
+def baseline_measure(name: str, baseline: dict[str, float]) -> float | None:
+    """
+    Returns the value of a measure in a baseline, looking for its old name
+    (see RENAMED_MEASURES) if the baseline is older than its new name.
+
+    :param name: the name of the measure.
+    :param baseline: the measures of the baseline.
+    :return: the value of the measure, or None if the baseline does not have it.
+    """
+    if name in baseline:
+        return baseline[name]
+    for new_name, old_name in RENAMED_MEASURES.items():
+        if new_name in name:
+            return baseline.get(name.replace(new_name, old_name))
+    return None
+
+
+def compare_with_baseline(
+    results: dict[str, float], baseline: dict[str, float], tolerance: float
+) -> list[str]:
+    """
+    Finds the measures that are slower than in the baseline.
+    The measures that are not in the baseline are listed, but are not regressions.
+
+    :param results: the new measures.
+    :param baseline: the measures of the baseline.
+    :param tolerance: the fraction by which a measure can be slower without being a regression.
+    :return: a description of each regression.
+    """
+    regressions = []
+    for name, duration in results.items():
+        reference = baseline_measure(name, baseline)
+        if reference is None:
+            print(f"NEW {name}: not in the baseline")
+        elif reference and duration > reference * (1 + tolerance):
+            regressions.append(
+                f"{name}: {duration:.3g} s instead of {reference:.3g} s"
+                f" ({duration / reference:.2f}x)"
+            )
+    return regressions
+
+
+def main(arguments: list[str] = None) -> None:
+    """
+    Runs the benchmarks on synthetic worlds of the given sizes, saves the results as JSON,
+    and compares them to a baseline if there is one. Exits with an error if a measure regressed.
+
+    :param arguments: the command line arguments, sys.argv by default.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Times the main operations of the project.")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="the numbers of cities"
+    )
+    parser.add_argument(
+        "--path-finding-max-cities",
+        type=int,
+        default=PATH_FINDING_MAX_CITIES,
+        help="the largest world where shortest paths are searched, but with hierarchical vehicles",
+    )
+    parser.add_argument("--output", default="benchmark_results.json", help="the results file")
+    parser.add_argument("--baseline", default="benchmark_baseline.json", help="the baseline file")
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="save the results as the new baseline"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCE,
+        help="the fraction by which a measure can be slower than the baseline",
+    )
+    parser.add_argument(
+        "--registry-scaling",
+        action="store_true",
+        help=f"also time filling the registries with {REGISTRY_SCALING_SIZES} cities (slow),"
+        f" and fail if the time per city grows more than {MAX_REGISTRY_GROWTH}x",
+    )
+    # run by run_in_subprocess
+    parser.add_argument("--world", help=argparse.SUPPRESS)
+    parser.add_argument("--registry-sizes", type=int, nargs="+", help=argparse.SUPPRESS)
+    parser.add_argument("--plotting", action="store_true", help=argparse.SUPPRESS)
+    stats.add_arguments(parser)
+    options = parser.parse_args(arguments)
+
+    if options.profile:
+        options.profile = os.path.abspath(options.profile)
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    if options.world is not None:
+        results = stats.run(
+            options, run_world_benchmarks, options.world, options.path_finding_max_cities
+        )
+        print(json.dumps(results))
+        return
+    if options.plotting:
+        print(json.dumps(stats.run(options, run_plotting_benchmarks)))
+        return
+    if options.registry_sizes:
+        print(json.dumps(stats.run(options, run_registry_benchmarks, options.registry_sizes)))
+        return
+
+    # the benchmarks run in other processes, each one is profiled on its own
+    def profiling_arguments(name: str) -> list[str]:
+        arguments = ["--stats"] if options.stats else []
+        if options.profile:
+            arguments += ["--profile", f"{options.profile}.{name}"]
+        return arguments
+
+    os.makedirs(WORLDS_DIRECTORY, exist_ok=True)
+    results = dict()
+    regressions = []
+    for size in options.sizes:
+        path = os.path.join(WORLDS_DIRECTORY, f"world_{size}.csv")
+        if not os.path.exists(path):
+            generate_world(path, size)
+        world_results = run_in_subprocess(
+            ["--world", path, "--path-finding-max-cities", str(options.path_finding_max_cities)]
+            + profiling_arguments(str(size))
+        )
+        for name, duration in world_results.items():
+            results[f"{size}/{name}"] = duration
+            print(f"{size:>8} cities  {name:<48} {duration:.3g} s")
+
+    for name, duration in run_in_subprocess(["--plotting"] + profiling_arguments("plotting")).items():
+        results[name] = duration
+        print(f"{'':>8}         {name:<48} {duration:.3g} s")
+
+    if options.registry_scaling:
+        registry_results = run_in_subprocess(
+            ["--registry-sizes"]
+            + [str(size) for size in REGISTRY_SCALING_SIZES]
+            + profiling_arguments("registry")
+        )
+        for name, duration in registry_results.items():
+            results[name] = duration
+            print(f"{'':>8}         {name:<48} {duration:.3g} s")
+        # linear registries take the same time per city whatever their size
+        growth = registry_results[f"registry_fill_{REGISTRY_SCALING_SIZES[-1]}_per_city_s"] / (
+            registry_results[f"registry_fill_{REGISTRY_SCALING_SIZES[0]}_per_city_s"]
+        )
+        print(
+            f"{'':>8}         time per city grows {growth:.2f}x from {REGISTRY_SCALING_SIZES[0]}"
+            f" to {REGISTRY_SCALING_SIZES[-1]} cities"
+        )
+        if growth > MAX_REGISTRY_GROWTH:
+            regressions.append(
+                f"registry_fill: time per city grows {growth:.2f}x from {REGISTRY_SCALING_SIZES[0]}"
+                f" to {REGISTRY_SCALING_SIZES[-1]} cities (more than {MAX_REGISTRY_GROWTH}x)"
+            )
+
+    with open(options.output, "w") as file:
+        json.dump(
+            {
+                "python": platform.python_version(),
+                "machine": platform.platform(),
+                "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "results": results,
+            },
+            file,
+            indent=2,
+        )
+    print(f"Results saved to {options.output}")
+
+    if options.save_baseline:
+        with open(options.baseline, "w") as file:
+            json.dump({"results": results}, file, indent=2)
+        print(f"Baseline saved to {options.baseline}")
+    elif not os.path.exists(options.baseline):
+        print(f"No baseline to compare to ({options.baseline}), use --save-baseline to make one")
+    else:
+        with open(options.baseline) as file:
+            baseline = json.load(file)["results"]
+        regressions += compare_with_baseline(results, baseline, options.tolerance)
+        if not regressions:
+            print(f"No regression compared to {options.baseline}")
+
+    for regression in regressions:
+        print("REGRESSION " + regression)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,116 @@
 from __future__ import annotations  # https://peps.python.org/pep-0563/
 from typing import Tuple
+from array import array
 import math
 from geopy.distance import great_circle
+from distance_matrix import DistanceMatrix
+
+# above this number of cities, the distance matrix would take too much memory
+# (64 MB of 32-bit integers for 4000 cities) and City.distance computes each distance
+# on its own instead
+MAX_DISTANCE_MATRIX_CITIES = 4000
+
+
+class CityStore:
+    """
+    The data of all the cities, stored column by column.
+    Row i holds the data of the i-th city created.
+    """
+
+    def __init__(self) -> None:
+        """
+        Creates an empty store.
+
+        :return: None
+        """
+        self.names = []
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.populations = array("q")
+        self.city_ids = array("q")
+        # index of the type of each city in city_types
+        self.type_codes = array("H")
+
+        # the distinct city types (e.g. "admin"), in order of first appearance
+        self.city_types = []
+        # associates each city type to its index in city_types
+        self.city_type_to_code = dict()
+
+    def __len__(self) -> int:
+        """
+        Returns the number of rows.
+        """
+        return len(self.city_ids)
+
+    def type_code(self, city_type: str) -> int:
+        """
+        Returns the index of a city type in city_types, adding it if it is new.
+
+        :param city_type: the type of city (e.g. admin).
+        :return: the index of the city type.
+        """
+        code = self.city_type_to_code.get(city_type)
+        if code is None:
+            code = len(self.city_types)
+            self.city_types.append(city_type)
+            self.city_type_to_code[city_type] = code
+        return code
+
+    def append(
+        self,
+        name: str,
+        coordinates: Tuple[float, float],
+        city_type: str,
+        population: int,
+        city_id: int,
+    ) -> int:
+        """
+        Adds a row with the data of a city.
+
+        :param name: the name of the city.
+        :param coordinates: the coordinates of the city (latitude, longitude)
+        :param city_type: the type of city (e.g. admin). Can be empty.
+        :param population: the population of the city.
+        :param city_id: an integer unique to this city.
+        :return: the index of the new row.
+        """
+        self.names.append(name)
+        self.latitudes.append(coordinates[0])
+        self.longitudes.append(coordinates[1])
+        self.populations.append(population)
+        self.city_ids.append(city_id)
+        self.type_codes.append(self.type_code(city_type))
+        return len(self.city_ids) - 1
 
 
 class City:
     """
     Represents a city.
+    Its data is stored in a row of City.store, the instance only knows the index of that row.
     """
 
+    __slots__ = ("row",)
+
+    # the data of every city ever created
+    store = CityStore()
+
     # associates an id to an instance of City
     id_to_cities = dict()
 
-    # associates city names to a list of instances of City.
+    # associates city names to a list of instances of City, in the order they were created.
     # We use a list because there may be multiple cities with the same name.
     name_to_cities = dict()
 
-    # list of the city instance that is found in name_to_cities
-    list_of_found_cities = []
-    # list of the city instances with the same city names
-    list_of_same_cities = []
-
     table_headers = ["Name", "Coordinates", "City type", "Population", "City ID"]
 
+    # incremented every time a city is registered, so that caches built from
+    # the registry (such as the distance matrix) know when to be rebuilt
+    registry_version = 0
+
+    # the distance matrix of the cities in id_to_cities, built by get_distance_matrix
+    # before many distances are needed (e.g. by path_finding.prepare_search)
+    distance_matrix = None
+
     def __init__(
         self,
         name: str,
@@ -41,37 +129,96 @@ class City:
         :city_id: an integer unique to this city.
         :return: None
         """
-        self.name = name
-        self.coordinates = coordinates
-        self.city_type = city_type
-        self.population = population
-        self.city_id = city_id
+        self.row = City.store.append(name, coordinates, city_type, population, city_id)
 
-        City.id_to_cities.update({self.city_id: self})
+        City.id_to_cities[self.city_id] = self
+        City.registry_version += 1
 
-        # process to add cities into name_to_cities depending if it is a new key or not
-        # reason this is created, is to prevent new cities with same name (same key), to overwrite previous values
-        if self.name not in City.name_to_cities:
-            City.list_of_found_cities.append({self.name: self})
-            City.name_to_cities.update({self.name: [self]})
+        # a city with the same name as previous ones is added to their list,
+        # so that it does not overwrite them
+        same_cities = City.name_to_cities.get(name)
+        if same_cities is None:
+            City.name_to_cities[name] = [self]
         else:
-            for city in City.list_of_found_cities:
-                for key in city.keys():
-                    if key == self.name:
-                        City.list_of_same_cities.append(city[key])
-                        City.list_of_same_cities.append(self)
+            same_cities.append(self)
+
+    @property
+    def name(self) -> str:
+        """
+        The name of the city.
+        """
+        return City.store.names[self.row]
+
+    @name.setter
+    def name(self, name: str) -> None:
+        City.store.names[self.row] = name
+
+    @property
+    def coordinates(self) -> Tuple[float, float]:
+        """
+        The coordinates of the city (latitude, longitude).
+        """
+        return (City.store.latitudes[self.row], City.store.longitudes[self.row])
+
+    @coordinates.setter
+    def coordinates(self, coordinates: Tuple[float, float]) -> None:
+        City.store.latitudes[self.row] = coordinates[0]
+        City.store.longitudes[self.row] = coordinates[1]
+        # the distances of the matrix and the caches built from the registry are now wrong
+        City.distance_matrix = None
+        City.registry_version += 1
+
+    @property
+    def city_type(self) -> str:
+        """
+        The type of city (e.g. admin). Can be empty.
+        """
+        return City.store.city_types[City.store.type_codes[self.row]]
+
+    @city_type.setter
+    def city_type(self, city_type: str) -> None:
+        City.store.type_codes[self.row] = City.store.type_code(city_type)
+
+    @property
+    def population(self) -> int:
+        """
+        The population of the city.
+        """
+        return City.store.populations[self.row]
 
-            City.name_to_cities[self.name] = City.list_of_same_cities
-            City.list_of_same_cities = []
+    @population.setter
+    def population(self, population: int) -> None:
+        City.store.populations[self.row] = population
+
+    @property
+    def city_id(self) -> int:
+        """
+        An integer unique to this city.
+        """
+        return City.store.city_ids[self.row]
+
+    @city_id.setter
+    def city_id(self, city_id: int) -> None:
+        City.store.city_ids[self.row] = city_id
+        City.distance_matrix = None
+        City.registry_version += 1
 
     def distance(self, other_city: City) -> int:
         """
         Returns the distance in kilometers between two cities using the great circle method,
         rounded up to an integer.
+        The distance is read from the distance matrix if it was built with both cities
+        (see get_distance_matrix), and computed with geopy otherwise.
 
         :param other_city: a city to measure the distance to
         :return: the rounded-up distance in kilometers
         """
+        matrix = City.distance_matrix
+        if matrix is not None:
+            distance = matrix.distance(self, other_city)
+            if distance is not None:
+                return distance
+
         return math.ceil(great_circle(self.coordinates, other_city.coordinates).km)
 
     def __str__(self) -> str:
@@ -102,6 +249,35 @@ class City:
         ]
 
 
+def get_distance_matrix() -> DistanceMatrix | None:
+    """
+    Returns the distance matrix of all the known cities, building it the first time.
+    It is only built when many distances are about to be needed (e.g. by
+    path_finding.prepare_search), since City.distance does not build it.
+    When cities were only added since, only the distances from the new cities are computed,
+    so adding cities between queries stays cheap. It is built again from scratch if a city
+    was replaced.
+    Returns None if there are more than MAX_DISTANCE_MATRIX_CITIES cities: the distances
+    would take too much memory, and City.distance computes each one with geopy instead.
+
+    :return: the distance matrix of the cities in City.id_to_cities, or None.
+    """
+    matrix = City.distance_matrix
+    if matrix is None or matrix.version != City.registry_version:
+        if len(City.id_to_cities) > MAX_DISTANCE_MATRIX_CITIES:
+            return None
+        cities = list(City.id_to_cities.values())
+        if matrix is not None and matrix.starts(cities):
+            matrix.extend(
+                cities[len(matrix.cities) :], City.registry_version, MAX_DISTANCE_MATRIX_CITIES
+            )
+        else:
+            matrix = DistanceMatrix(cities, City.registry_version)
+            City.distance_matrix = matrix
+
+    return matrix
+
+
 def get_city_by_id(city_id: int) -> City | None:
     """
     Given a city ID, returns the city with that ID if one is known, None otherwise.
@@ -109,12 +285,7 @@ def get_city_by_id(city_id: int) -> City | None:
     :param city_id: the ID of the city.
     :return: the city with that ID if one is known, None otherwise.
     """
-    list_of_ids = City.id_to_cities
-    for id in list_of_ids.keys():
-        if city_id == id:
-            return list_of_ids[id]
-
-    return None
+    return City.id_to_cities.get(city_id)
 
 
 def get_cities_by_name(city_name: str) -> list[City]:
@@ -125,13 +296,7 @@ def get_cities_by_name(city_name: str) -> list[City]:
     :param city_name: the name of the city.
     :return: the list of cities known by this name.
     """
-    list_of_cities = City.name_to_cities
-
-    for city in list_of_cities.keys():
-        if city == city_name:
-            return list_of_cities[city]
-
-    return []
+    return City.name_to_cities.get(city_name, [])
 
 
 def create_example_cities() -> None:
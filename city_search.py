@@ -0,0 +1,289 @@
+import bisect
+import heapq
+import re
+import time
+import unicodedata
+import numpy as np
+
+from city import City, create_example_cities
+
+# number of cities returned by a search by default
+SEARCH_LIMIT = 10
+
+# maximum number of edits (insertions, deletions, substitutions) between a query and a name
+MAX_EDITS = 2
+
+# maximum number of names whose edit distance to a query is computed
+MAX_FUZZY_CANDIDATES = 100
+
+# the best cities for prefixes up to this length are computed when the index is built
+SHORT_PREFIX_LENGTH = 3
+
+# the index built by get_city_name_index and the version of the city registry it was built from
+city_name_index = None
+city_name_index_version = None
+
+
+def normalize_name(name: str) -> str:
+    """
+    Returns a name without accents, case, punctuation or repeated spaces,
+    so that e.g. "São Paulo" and "sao  paulo" are the same.
+
+    :param name: a city name, or a user input.
+    :return: the normalized name.
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    without_accents = "".join(
+        character for character in decomposed if not unicodedata.combining(character)
+    )
+    return " ".join(re.sub(r"[^\w]+", " ", without_accents.casefold()).split())
+
+
+def trigrams(name: str) -> set[str]:
+    """
+    Returns the sequences of 3 characters of a normalized name, padded with spaces
+    so that the start and the end of the name count too.
+
+    :param name: a normalized name.
+    :return: the set of trigrams of the name.
+    """
+    padded = "  " + name + " "
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+def edit_distance(first: str, second: str, max_edits: int) -> int:
+    """
+    Returns the number of insertions, deletions and substitutions needed to go from a string
+    to another (Levenshtein distance), or max_edits + 1 if more are needed.
+    Uses Myers' bit-parallel algorithm, with one bit per character of the first string.
+
+    :param first: a string.
+    :param second: another string.
+    :param max_edits: the largest distance that matters.
+    :return: the distance, at most max_edits + 1.
+    """
+    if abs(len(first) - len(second)) > max_edits:
+        return max_edits + 1
+    if not first:
+        return min(len(second), max_edits + 1)
+
+    # the bits of the positions of each character in the first string
+    positions = dict()
+    for index, character in enumerate(first):
+        positions[character] = positions.get(character, 0) | (1 << index)
+
+    mask = (1 << len(first)) - 1
+    last_bit = 1 << (len(first) - 1)
+    # the vertical differences between successive cells of the current column, as bits
+    positive, negative = mask, 0
+    distance = len(first)
+
+    for character in second:
+        equal = positions.get(character, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        horizontal_positive = negative | (~(horizontal | positive) & mask)
+        horizontal_negative = positive & horizontal
+
+        if horizontal_positive & last_bit:
+            distance += 1
+        elif horizontal_negative & last_bit:
+            distance -= 1
+
+        horizontal_positive = ((horizontal_positive << 1) | 1) & mask
+        horizontal_negative = (horizontal_negative << 1) & mask
+        positive = horizontal_negative | (~(vertical | horizontal_positive) & mask)
+        negative = horizontal_positive & vertical
+
+    return min(distance, max_edits + 1)
+
+
+class CityNameIndex:
+    """
+    An index of city names answering prefix and misspelled-name queries,
+    with the most populous cities first.
+    """
+
+    def __init__(self, cities: list[City]) -> None:
+        """
+        Creates the index of the given cities.
+
+        :param cities: the cities to index.
+        :return: None
+        """
+        # associates each normalized name to its cities, from the most to the least populous
+        self.name_to_cities = dict()
+        for city in cities:
+            self.name_to_cities.setdefault(normalize_name(city.name), []).append(city)
+        for same_cities in self.name_to_cities.values():
+            same_cities.sort(key=lambda city: city.population, reverse=True)
+
+        # the normalized names in alphabetical order, for prefix queries
+        self.names = sorted(self.name_to_cities)
+        self.name_lengths = np.array([len(name) for name in self.names])
+
+        # the most populous cities for each short prefix, whose range of names would be long to scan
+        self.top_by_prefix = dict()
+        for name in self.names:
+            for length in range(min(len(name), SHORT_PREFIX_LENGTH) + 1):
+                self.top_by_prefix.setdefault(name[:length], []).extend(
+                    self.name_to_cities[name]
+                )
+        for prefix, prefix_cities in self.top_by_prefix.items():
+            self.top_by_prefix[prefix] = heapq.nlargest(
+                SEARCH_LIMIT, prefix_cities, key=lambda city: city.population
+            )
+
+        # associates each trigram to the positions in names of the names containing it, for misspelled names
+        trigram_to_positions = dict()
+        for position, name in enumerate(self.names):
+            for trigram in trigrams(name):
+                trigram_to_positions.setdefault(trigram, []).append(position)
+        self.trigram_to_positions = {
+            trigram: np.array(positions)
+            for trigram, positions in trigram_to_positions.items()
+        }
+
+    def exact(self, query: str) -> list[City]:
+        """
+        Returns the cities whose name is the query, ignoring case, accents and punctuation.
+
+        :param query: the name to look for.
+        :return: the cities with this name, the most populous first.
+        """
+        return list(self.name_to_cities.get(normalize_name(query), []))
+
+    def prefix(self, query: str, limit: int = SEARCH_LIMIT) -> list[City]:
+        """
+        Returns the most populous cities whose name starts with the query.
+
+        :param query: the start of the name.
+        :param limit: the maximum number of cities returned.
+        :return: the cities, the most populous first.
+        """
+        query = normalize_name(query)
+        if len(query) <= SHORT_PREFIX_LENGTH and limit <= SEARCH_LIMIT:
+            return self.top_by_prefix.get(query, [])[:limit]
+
+        start = bisect.bisect_left(self.names, query)
+        end = bisect.bisect_left(self.names, query + "\U0010ffff")
+
+        return heapq.nlargest(
+            limit,
+            (
+                city
+                for name in self.names[start:end]
+                for city in self.name_to_cities[name]
+            ),
+            key=lambda city: city.population,
+        )
+
+    def fuzzy(
+        self, query: str, max_edits: int = MAX_EDITS, limit: int = SEARCH_LIMIT
+    ) -> list[City]:
+        """
+        Returns the most populous cities whose name is at most max_edits edits away from the query.
+
+        :param query: the name to look for, possibly misspelled.
+        :param max_edits: the maximum number of edits.
+        :param limit: the maximum number of cities returned.
+        :return: the cities, the closest names first, then the most populous first.
+        """
+        query = normalize_name(query)
+        query_trigrams = trigrams(query)
+
+        # a short query is close to too many names to be useful
+        max_edits = min(max_edits, len(query) // 4)
+        if max_edits == 0:
+            return []
+
+        # an edit changes at most 3 trigrams, so a close name shares most trigrams with the query
+        postings = [
+            self.trigram_to_positions[trigram]
+            for trigram in query_trigrams
+            if trigram in self.trigram_to_positions
+        ]
+        if not postings:
+            return []
+        shared_counts = np.bincount(np.concatenate(postings), minlength=len(self.names))
+        minimum_shared = max(len(query_trigrams) - 3 * max_edits, 1)
+        close_positions = np.nonzero(
+            (shared_counts >= minimum_shared)
+            & (np.abs(self.name_lengths - len(query)) <= max_edits)
+        )[0]
+
+        # the names sharing the most trigrams are the likeliest to be close
+        if len(close_positions) > MAX_FUZZY_CANDIDATES:
+            best = np.argpartition(
+                -shared_counts[close_positions], MAX_FUZZY_CANDIDATES
+            )[:MAX_FUZZY_CANDIDATES]
+            close_positions = np.sort(close_positions[best])
+
+        candidates = []
+        for position in close_positions:
+            name = self.names[position]
+            distance = edit_distance(query, name, max_edits)
+            if distance <= max_edits:
+                for city in self.name_to_cities[name]:
+                    candidates.append((distance, -city.population, city))
+
+        return [city for _, _, city in heapq.nsmallest(limit, candidates, key=lambda x: x[:2])]
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> list[City]:
+        """
+        Returns the cities matching the query: cities with exactly this name first,
+        then the most populous cities whose name starts with it or is a close misspelling of it.
+
+        :param query: the name, the start of the name, or a misspelled name.
+        :param limit: the maximum number of cities returned.
+        :return: the cities found.
+        """
+        results = self.exact(query)
+        others = self.prefix(query, limit) + self.fuzzy(query, limit=limit)
+        others.sort(key=lambda city: city.population, reverse=True)
+
+        for city in others:
+            if len(results) >= limit:
+                break
+            if city not in results:
+                results.append(city)
+
+        return results[:limit]
+
+
+def get_city_name_index() -> CityNameIndex:
+    """
+    Returns the name index of all the known cities, building it if cities were added since
+    it was last built.
+
+    :return: the name index of the cities in City.id_to_cities.
+    """
+    global city_name_index, city_name_index_version
+
+    if city_name_index is None or city_name_index_version != City.registry_version:
+        city_name_index = CityNameIndex(list(City.id_to_cities.values()))
+        city_name_index_version = City.registry_version
+
+    return city_name_index
+
+
+def search_cities(query: str, limit: int = SEARCH_LIMIT) -> list[City]:
+    """
+    Returns the known cities matching a name, the start of a name, or a misspelled name
+    (see CityNameIndex.search).
+
+    :param query: the text to look for.
+    :param limit: the maximum number of cities returned.
+    :return: the cities found, the best matches first.
+    """
+    return get_city_name_index().search(query, limit)
+
+
+if __name__ == "__main__":
+    create_example_cities()
+
+    for query in ["Melbourne", "melb", "Melborne", "santiago", "Sidney", "kuala"]:
+        start = time.perf_counter()
+        cities = search_cities(query)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"{query}: {', '.join(str(city) for city in cities)} ({elapsed:.3f} ms)")
@@ -1,3 +1,6 @@
+import bisect
+import heapq
+from collections import Counter
 from tabulate import tabulate
 from city import City, create_example_cities
 
@@ -14,6 +17,13 @@ class Country:
     # value is an array of city instances
     countries_and_their_cities = dict()
 
+    # associates the id of each city added to a country to the instance of that country
+    city_id_to_country = dict()
+
+    # incremented every time a city is added to a country, so that caches built from
+    # the countries (such as routing graphs) know when to be rebuilt
+    registry_version = 0
+
     def __init__(self, country_name: str, country_iso3: str) -> None:
         """
         Creates an instance with a country name and a country ISO code with 3 characters.
@@ -25,6 +35,14 @@ class Country:
         self.name = country_name
         self.iso3 = country_iso3
 
+        # associates each city type to the positions of the cities of that type
+        # in the list of cities of the country, in increasing order
+        self.positions_by_type = dict()
+
+        # the cities of the country from the most to the least populous,
+        # cities with the same population being in the order they were added
+        self.cities_by_population = []
+
         Country.name_to_countries[self.name] = self
 
     def add_city(self, city: City) -> None:
@@ -34,18 +52,20 @@ class Country:
         :param city: The city to add to this country
         :return: None
         """
-        # process to add new city into the country by the dict countries_and_their_cities
-        # if statement is to check if a country key exist or not first to see if its a new country needed to be added along with the city
-        # if not, we just add a new city instance to the country key and update the dict
+        Country.registry_version += 1
+        Country.city_id_to_country[city.city_id] = self
+
+        # the list of cities of the country is created with its first city
         if self.name not in Country.countries_and_their_cities:
-            Country.countries_and_their_cities.update({self.name: [city]})
+            Country.countries_and_their_cities[self.name] = [city]
         else:
-            old_value = Country.countries_and_their_cities[self.name]
-            new_list = []
-            for value in old_value:
-                new_list.append(value)
-            new_list.append(city)
-            Country.countries_and_their_cities.update({self.name: new_list})
+            Country.countries_and_their_cities[self.name].append(city)
+
+        position = len(Country.countries_and_their_cities[self.name]) - 1
+        self.positions_by_type.setdefault(city.city_type, []).append(position)
+        bisect.insort_right(
+            self.cities_by_population, city, key=lambda other: -other.population
+        )
 
     def get_cities(self, city_type: list[str] = None) -> list[City]:
         """
@@ -59,16 +79,20 @@ class Country:
         :param city_type: None, or a list of strings, each of which describes the type of city.
         :return: a list of cities in this country that have the specified city types.
         """
-        city_list = []
+        cities = Country.countries_and_their_cities.get(self.name, [])
+        if city_type is None:
+            return list(cities)
 
-        if city_type != None:
-            for city in Country.countries_and_their_cities[self.name]:
-                for city_type_selected in city_type:
-                    if city.city_type == city_type_selected:
-                        city_list.append(city)
-        elif self.name in Country.countries_and_their_cities.keys():
-            for city in Country.countries_and_their_cities[self.name]:
-                city_list.append(city)
+        # a type given several times returns its cities several times
+        type_counts = Counter(city_type)
+        positions = heapq.merge(
+            *(self.positions_by_type.get(selected, []) for selected in type_counts)
+        )
+
+        city_list = []
+        for position in positions:
+            city = cities[position]
+            city_list.extend([city] * type_counts[city.city_type])
 
         return city_list
 
@@ -84,10 +108,7 @@ class Country:
         headers = ["Order", "Name", "Coordinates", "City type", "Population", "City ID"]
         table = [headers]
 
-        cities = Country.countries_and_their_cities[self.name]
-        cities.sort(key=lambda city: city.population, reverse=True)
-
-        for index, city in enumerate(cities):
+        for index, city in enumerate(self.cities_by_population):
             table.append(
                 [
                     str(index),
@@ -132,11 +153,7 @@ def find_country_of_city(city: City) -> Country:
     :param city: The city.
     :return: The country where the city is.
     """
-    for country in Country.countries_and_their_cities.keys():
-        for index in range(0, len(Country.countries_and_their_cities[country])):
-            if Country.countries_and_their_cities[country][index] == city:
-                if country in Country.name_to_countries:
-                    return Country.name_to_countries[country]
+    return Country.city_id_to_country.get(city.city_id)
 
 
 def create_example_countries() -> None:
@@ -1,68 +1,87 @@
 import csv
+import hashlib
+import itertools
+import os
+import sys
+import time
+from array import array
 from city import City
 from country import Country
+from snapshot import load_snapshot, snapshot_digest
+import stats
 
 
-def create_cities_countries_from_csv(path_to_csv: str) -> None:
-    """
-    Reads a CSV file given its path and creates instances of City and Country for each line.
+# number of rows parsed at once by load_city_columns
+CHUNK_SIZE = 10000
 
-    :param path_to_csv: The path to the CSV file.
+# a snapshot of a CSV file (see snapshot.py) is saved next to it with this suffix
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+class CityColumns:
+    """
+    The cities of a CSV file, stored column by column in typed arrays.
+    City and Country instances are only created when asked for.
     """
-    with open(path_to_csv, "r") as file:
-        reader = csv.reader(file)
-        # retrieve all the headers value and skips the line as well
-        header = next(reader)
 
-        city_ascii_index = -1
-        lat_index = -1
-        long_index = -1
-        country_name_index = -1
-        country_iso3_index = -1
-        city_type_index = -1
-        population_index = -1
-        city_id_index = -1
-
-        # go through the header, and assign the index variables to the index found
-        for index, header_element in enumerate(header):
-            if header_element == "city_ascii":
-                city_ascii_index = index
-            elif header_element == "lat":
-                lat_index = index
-            elif header_element == "lng":
-                long_index = index
-            elif header_element == "country":
-                country_name_index = index
-            elif header_element == "iso3":
-                country_iso3_index = index
-            elif header_element == "capital":
-                city_type_index = index
-            elif header_element == "population":
-                population_index = index
-            elif header_element == "id":
-                city_id_index = index
-
-        # go through the values in the csv file, and assign each variable their value with now the index found
-        # parsing was required for a few variables due to later needing it to be used as params for creating instances of certain classes
-        for row in reader:
-            city_name = row[city_ascii_index]
-            coordinates = (float(row[lat_index]), float(row[long_index]))
-            country_name = row[country_name_index]
-            country_iso3 = row[country_iso3_index]
-            city_type = row[city_type_index]
-            # need the if statement, as some population was not provided in the csv file
-            # set to 0, if population is empty
-            if row[population_index] != "":
-                population = int(row[population_index])
-            else:
-                population = 0
-            city_id = int(row[city_id_index])
+    def __init__(self) -> None:
+        """
+        Creates empty columns.
+
+        :return: None
+        """
+        self.names = []
+        self.latitudes = array("d")
+        self.longitudes = array("d")
+        self.populations = array("q")
+        self.city_ids = array("q")
+        # index of the type of each city in city_types
+        self.type_codes = array("B")
+        # index of the country of each city in countries
+        self.country_codes = array("I")
+
+        # the distinct city types (e.g. "admin"), in order of first appearance
+        self.city_types = []
+        # the distinct (country name, country iso3) pairs, in order of first appearance
+        self.countries = []
+
+        # the speed at which the columns were loaded from the CSV file
+        self.rows_per_second = 0.0
 
+    def __len__(self) -> int:
+        """
+        Returns the number of cities.
+        """
+        return len(self.city_ids)
+
+    def create_city(self, index: int) -> City:
+        """
+        Creates the City instance of a row.
+
+        :param index: the index of the row, starting at 0.
+        :return: the city.
+        """
+        return City(
+            self.names[index],
+            (self.latitudes[index], self.longitudes[index]),
+            self.city_types[self.type_codes[index]],
+            self.populations[index],
+            self.city_ids[index],
+        )
+
+    def create_cities_countries(self) -> None:
+        """
+        Creates the instances of City and Country for each row, in order.
+
+        :return: None
+        """
+        for index in range(len(self)):
             # create a city instance
-            city = City(city_name, coordinates, city_type, population, city_id)
+            city = self.create_city(index)
 
             # create a new country instance and add the new city instance created to the country only if it is not already in name_to_countries
             # if country is found, we can just add the new city instance
+            country_name, country_iso3 = self.countries[self.country_codes[index]]
             if country_name not in Country.name_to_countries:
                 new_country = Country(country_name, country_iso3)
                 new_country.add_city(city)
@@ -70,7 +89,154 @@ def create_cities_countries_from_csv(path_to_csv: str) -> None:
                 Country.name_to_countries[country_name].add_city(city)
 
 
+def find_column_indexes(header: list[str]) -> tuple[int, ...]:
+    """
+    Finds the columns of the CSV file holding the data of the cities.
+
+    :param header: The first row of the CSV file.
+    :return: The indexes of the city_ascii, lat, lng, country, iso3, capital, population
+             and id columns, in this order. An index is -1 if the column is missing.
+    """
+    city_ascii_index = -1
+    lat_index = -1
+    long_index = -1
+    country_name_index = -1
+    country_iso3_index = -1
+    city_type_index = -1
+    population_index = -1
+    city_id_index = -1
+
+    # go through the header, and assign the index variables to the index found
+    for index, header_element in enumerate(header):
+        if header_element == "city_ascii":
+            city_ascii_index = index
+        elif header_element == "lat":
+            lat_index = index
+        elif header_element == "lng":
+            long_index = index
+        elif header_element == "country":
+            country_name_index = index
+        elif header_element == "iso3":
+            country_iso3_index = index
+        elif header_element == "capital":
+            city_type_index = index
+        elif header_element == "population":
+            population_index = index
+        elif header_element == "id":
+            city_id_index = index
+
+    return (
+        city_ascii_index,
+        lat_index,
+        long_index,
+        country_name_index,
+        country_iso3_index,
+        city_type_index,
+        population_index,
+        city_id_index,
+    )
+
+
+def load_city_columns(path_to_csv: str, chunk_size: int = CHUNK_SIZE) -> CityColumns:
+    """
+    Reads a CSV file given its path into columns, chunk_size rows at a time,
+    without creating any City or Country instance.
+
+    :param path_to_csv: The path to the CSV file.
+    :param chunk_size: The number of rows parsed at once.
+    :return: The columns of the cities.
+    """
+    start = time.perf_counter()
+    columns = CityColumns()
+    type_codes = dict()
+    country_codes = dict()
+
+    with open(path_to_csv, "r") as file:
+        reader = csv.reader(file)
+        # retrieve all the headers value and skips the line as well
+        header = next(reader)
+        (
+            city_ascii_index,
+            lat_index,
+            long_index,
+            country_name_index,
+            country_iso3_index,
+            city_type_index,
+            population_index,
+            city_id_index,
+        ) = find_column_indexes(header)
+
+        while True:
+            rows = list(itertools.islice(reader, chunk_size))
+            if not rows:
+                break
+            stats.increment("csv_rows", len(rows))
+
+            # parsing was required for a few columns due to later needing it to be used as params for creating instances of certain classes
+            columns.names.extend([row[city_ascii_index] for row in rows])
+            columns.latitudes.extend([float(row[lat_index]) for row in rows])
+            columns.longitudes.extend([float(row[long_index]) for row in rows])
+            # some population was not provided in the csv file, it is set to 0
+            columns.populations.extend(
+                [int(row[population_index] or 0) for row in rows]
+            )
+            columns.city_ids.extend([int(row[city_id_index]) for row in rows])
+
+            # the city types and the countries are few, each one is stored once and referred to by its index
+            for row in rows:
+                city_type = row[city_type_index]
+                if city_type not in type_codes:
+                    type_codes[city_type] = len(columns.city_types)
+                    columns.city_types.append(city_type)
+                columns.type_codes.append(type_codes[city_type])
+
+                country = (row[country_name_index], row[country_iso3_index])
+                if country not in country_codes:
+                    country_codes[country] = len(columns.countries)
+                    columns.countries.append(country)
+                columns.country_codes.append(country_codes[country])
+
+    elapsed = time.perf_counter() - start
+    if elapsed > 0:
+        columns.rows_per_second = len(columns) / elapsed
+
+    return columns
+
+
+def csv_digest(path_to_csv: str) -> str:
+    """
+    Returns the SHA-256 digest of a CSV file, which changes whenever its content changes.
+
+    :param path_to_csv: The path to the CSV file.
+    :return: The digest as a hexadecimal string.
+    """
+    with open(path_to_csv, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def create_cities_countries_from_csv(path_to_csv: str) -> None:
+    """
+    Reads a CSV file given its path and creates instances of City and Country for each line.
+    If a snapshot of the same content was saved next to the CSV file, it is loaded instead.
+    A snapshot that cannot be read (e.g. truncated or of another version) is ignored.
+
+    :param path_to_csv: The path to the CSV file.
+    """
+    snapshot_path = path_to_csv + SNAPSHOT_SUFFIX
+    if os.path.exists(snapshot_path):
+        try:
+            if snapshot_digest(snapshot_path) == csv_digest(path_to_csv):
+                load_snapshot(snapshot_path)
+                return
+        except (ValueError, OSError) as error:
+            print(f"Ignoring the snapshot {snapshot_path}: {error}", file=sys.stderr)
+
+    load_city_columns(path_to_csv).create_cities_countries()
+
+
 if __name__ == "__main__":
-    create_cities_countries_from_csv("worldcities_truncated.csv")
+    columns = load_city_columns("worldcities_truncated.csv")
+    print(f"Loaded {len(columns)} rows ({columns.rows_per_second:.0f} rows per second)")
+    columns.create_cities_countries()
     for country in Country.name_to_countries.values():
         country.print_cities()
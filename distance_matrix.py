@@ -0,0 +1,231 @@
+from __future__ import annotations  # https://peps.python.org/pep-0563/
+from typing import Iterable, TYPE_CHECKING
+import math
+import numpy as np
+from geopy.distance import great_circle, EARTH_RADIUS
+
+if TYPE_CHECKING:
+    from city import City
+
+# number of rows of the matrix computed at once, to bound the size of the temporary float arrays
+BLOCK_SIZE = 512
+
+# distances closer than this to an integer are recomputed with geopy,
+# so that rounding up gives exactly the same result as City.distance always did
+INTEGER_TOLERANCE = 1e-6
+
+
+def great_circle_km(
+    latitudes_1: np.ndarray,
+    longitudes_1: np.ndarray,
+    latitudes_2: np.ndarray,
+    longitudes_2: np.ndarray,
+) -> np.ndarray:
+    """
+    Returns the great circle distances in kilometers between two sets of coordinates (in degrees).
+    The arrays are broadcast against each other, and the formula is the one used by geopy.
+
+    :param latitudes_1: the latitudes of the first set of coordinates.
+    :param longitudes_1: the longitudes of the first set of coordinates.
+    :param latitudes_2: the latitudes of the second set of coordinates.
+    :param longitudes_2: the longitudes of the second set of coordinates.
+    :return: the distances in kilometers, as floats.
+    """
+    lat1, lng1 = np.radians(latitudes_1), np.radians(longitudes_1)
+    lat2, lng2 = np.radians(latitudes_2), np.radians(longitudes_2)
+
+    sin_lat1, cos_lat1 = np.sin(lat1), np.cos(lat1)
+    sin_lat2, cos_lat2 = np.sin(lat2), np.cos(lat2)
+
+    delta_lng = lng2 - lng1
+    cos_delta_lng, sin_delta_lng = np.cos(delta_lng), np.sin(delta_lng)
+
+    d = np.arctan2(
+        np.sqrt(
+            (cos_lat2 * sin_delta_lng) ** 2
+            + (cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * cos_delta_lng) ** 2
+        ),
+        sin_lat1 * sin_lat2 + cos_lat1 * cos_lat2 * cos_delta_lng,
+    )
+
+    return EARTH_RADIUS * d
+
+
+def ceil_great_circle_km(
+    latitudes_1: np.ndarray,
+    longitudes_1: np.ndarray,
+    latitudes_2: np.ndarray,
+    longitudes_2: np.ndarray,
+) -> np.ndarray:
+    """
+    Returns the great circle distances in kilometers between two sets of coordinates (in degrees),
+    rounded up to integers. The results are identical to math.ceil(great_circle(...).km).
+
+    :param latitudes_1: the latitudes of the first set of coordinates.
+    :param longitudes_1: the longitudes of the first set of coordinates.
+    :param latitudes_2: the latitudes of the second set of coordinates.
+    :param longitudes_2: the longitudes of the second set of coordinates.
+    :return: the rounded-up distances in kilometers, as integers.
+    """
+    kilometers = great_circle_km(latitudes_1, longitudes_1, latitudes_2, longitudes_2)
+    distances = np.ceil(kilometers).astype(np.int64)
+
+    # numpy's trigonometry can differ from the math module in the last bits,
+    # which only matters when rounding up a value that is (almost) an integer
+    near_integer = np.abs(kilometers - np.rint(kilometers)) < INTEGER_TOLERANCE
+    if near_integer.any():
+        lat1, lng1, lat2, lng2 = np.broadcast_arrays(
+            latitudes_1, longitudes_1, latitudes_2, longitudes_2
+        )
+        for index in zip(*np.nonzero(near_integer)):
+            distances[index] = math.ceil(
+                great_circle((lat1[index], lng1[index]), (lat2[index], lng2[index])).km
+            )
+
+    return distances
+
+
+class DistanceMatrix:
+    """
+    The distances in kilometers (rounded up) between every pair of a set of cities,
+    computed in one batched pass.
+    """
+
+    def __init__(
+        self, cities: Iterable[City], version: int = 0, distances: np.ndarray = None
+    ) -> None:
+        """
+        Computes the distances between every pair of the given cities.
+
+        :param cities: the cities, each with a unique city ID.
+        :param version: the version of the city registry the cities were taken from.
+        :param distances: the distances between the cities if they are already known
+                          (e.g. saved in a snapshot), in which case they are not computed.
+        :return: None
+        """
+        self.version = version
+        self.cities = list(cities)
+        self.id_to_index = {city.city_id: index for index, city in enumerate(self.cities)}
+
+        self.latitudes = np.array([city.coordinates[0] for city in self.cities], dtype=float)
+        self.longitudes = np.array([city.coordinates[1] for city in self.cities], dtype=float)
+
+        if distances is None:
+            size = len(self.cities)
+            distances = np.empty((size, size), dtype=np.int32)
+            self.compute_rows(distances, 0, size)
+
+        # the distances are a view of the top left corner of a possibly larger buffer,
+        # so that cities can be added without copying the matrix each time (see extend)
+        self.buffer = distances
+        self.distances = distances
+
+    def compute_rows(self, distances: np.ndarray, start: int, stop: int) -> None:
+        """
+        Computes the rows of the matrix of the cities between two indexes.
+
+        :param distances: the matrix to fill, with at least len(self.cities) columns.
+        :param start: the index of the first city.
+        :param stop: the index after the last city.
+        :return: None
+        """
+        size = len(self.cities)
+        for block_start in range(start, stop, BLOCK_SIZE):
+            block_stop = min(block_start + BLOCK_SIZE, stop)
+            distances[block_start:block_stop, :size] = ceil_great_circle_km(
+                self.latitudes[block_start:block_stop, np.newaxis],
+                self.longitudes[block_start:block_stop, np.newaxis],
+                self.latitudes[np.newaxis, :],
+                self.longitudes[np.newaxis, :],
+            )
+
+    def starts(self, cities: list[City]) -> bool:
+        """
+        Returns whether the cities of the matrix are the first ones of a list of cities,
+        in the same order.
+
+        :param cities: the cities.
+        :return: whether the matrix can be extended to the cities.
+        """
+        return len(cities) >= len(self.cities) and all(
+            city is other for city, other in zip(self.cities, cities)
+        )
+
+    def extend(self, cities: Iterable[City], version: int, max_capacity: int = None) -> None:
+        """
+        Adds cities to the matrix, only computing the distances from the new cities.
+        The matrix grows in place, taking room for twice as many cities when it is full
+        (but for no more than max_capacity cities).
+
+        :param cities: the new cities, each with a unique city ID.
+        :param version: the version of the city registry the cities were taken from.
+        :param max_capacity: the largest number of cities the matrix makes room for in advance.
+        :return: None
+        """
+        cities = list(cities)
+        old_size = len(self.cities)
+        size = old_size + len(cities)
+
+        if size > len(self.buffer):
+            capacity = 2 * size if max_capacity is None else min(2 * size, max_capacity)
+            buffer = np.empty((max(capacity, size),) * 2, dtype=np.int32)
+            buffer[:old_size, :old_size] = self.distances
+            self.buffer = buffer
+
+        for index, city in enumerate(cities, old_size):
+            self.id_to_index[city.city_id] = index
+        self.cities.extend(cities)
+        self.latitudes = np.concatenate(
+            (self.latitudes, [city.coordinates[0] for city in cities])
+        )
+        self.longitudes = np.concatenate(
+            (self.longitudes, [city.coordinates[1] for city in cities])
+        )
+
+        # the new rows, and the new columns of the old rows by symmetry
+        self.compute_rows(self.buffer, old_size, size)
+        self.buffer[:old_size, old_size:size] = self.buffer[old_size:size, :old_size].T
+        self.distances = self.buffer[:size, :size]
+        self.version = version
+
+    def index_of(self, city: City) -> int | None:
+        """
+        Returns the row of the matrix of a city, or None if the matrix was not built with this city.
+
+        :param city: the city.
+        :return: the index of the city, or None.
+        """
+        index = self.id_to_index.get(city.city_id)
+        if index is None or self.cities[index] is not city:
+            return None
+        return index
+
+    def distance(self, departure: City, arrival: City) -> int | None:
+        """
+        Returns the rounded-up distance in kilometers between two cities,
+        or None if one of them is not in the matrix.
+
+        :param departure: the first city.
+        :param arrival: the second city.
+        :return: the distance in kilometers, or None.
+        """
+        departure_index = self.index_of(departure)
+        arrival_index = self.index_of(arrival)
+        if departure_index is None or arrival_index is None:
+            return None
+        return int(self.distances[departure_index, arrival_index])
+
+    def path_distance(self, cities: list[City]) -> int | None:
+        """
+        Returns the sum of the distances between successive cities,
+        or None if one of them is not in the matrix.
+
+        :param cities: a sequence of cities.
+        :return: the total distance in kilometers, or None.
+        """
+        indexes = [self.index_of(city) for city in cities]
+        if None in indexes:
+            return None
+        if len(indexes) < 2:
+            return 0
+        return int(self.distances[indexes[:-1], indexes[1:]].sum())
@@ -0,0 +1,261 @@
+import math
+from collections import OrderedDict
+import numpy as np
+
+from city import City
+from country import Country, find_country_of_city
+from distance_matrix import ceil_great_circle_km
+from itinerary import Itinerary
+from vehicles import DiplomacyDonutDinghy
+import stats
+
+# marks a primary city without predecessor in the predecessor table of the backbone
+NO_PREDECESSOR = -1
+
+# the maximum number of routers kept by get_router
+ROUTER_CACHE_SIZE = 8
+
+# associates the speeds of a vehicle to its router, from the least to the most recently used
+router_cache = OrderedDict()
+
+# the versions of the city and country registries the cached routers were built from
+router_cache_version = None
+
+
+def coordinates_of(cities: list[City]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Returns the coordinates of some cities as arrays.
+
+    :param cities: the cities.
+    :return: the latitudes and the longitudes of the cities.
+    """
+    rows = [city.row for city in cities]
+    return (
+        np.frombuffer(City.store.latitudes)[rows],
+        np.frombuffer(City.store.longitudes)[rows],
+    )
+
+
+class HierarchicalRouter:
+    """
+    Finds shortest paths for a DiplomacyDonutDinghy without a graph of all the cities.
+
+    A non-primary city can only travel inside its country, and the direct trip is always
+    the fastest way between two cities at the same speed. So a shortest path either is a
+    direct trip inside a country, or goes from the departure to a primary city of its country,
+    then along the backbone of the primary cities, then to the arrival from a primary city
+    of its country.
+    The shortest paths between primary cities are computed once. A trip between two primary
+    cities of the same country may be faster through a non-primary city of that country,
+    at the speed within a country.
+    A query then only depends on the number of primary cities in the two countries.
+    """
+
+    def __init__(self, vehicle: DiplomacyDonutDinghy) -> None:
+        """
+        Computes the shortest paths between all the primary cities for a vehicle.
+
+        :param vehicle: the vehicle.
+        :return: None
+        """
+        self.vehicle = vehicle
+        in_country_speed = vehicle.in_country_speed
+
+        cities = list(City.id_to_cities.values())
+        self.primaries = [city for city in cities if city.city_type == "primary"]
+        self.primary_indexes = {city.city_id: index for index, city in enumerate(self.primaries)}
+        size = len(self.primaries)
+
+        # the indexes of the primary cities of each country, by country name
+        self.country_primaries = dict()
+        for index, primary in enumerate(self.primaries):
+            country = find_country_of_city(primary)
+            if country is not None:
+                self.country_primaries.setdefault(country.name, []).append(index)
+
+        latitudes, longitudes = coordinates_of(self.primaries)
+        distances = ceil_great_circle_km(
+            latitudes[:, np.newaxis],
+            longitudes[:, np.newaxis],
+            latitudes[np.newaxis, :],
+            longitudes[np.newaxis, :],
+        )
+        travel_times = np.ceil(distances / vehicle.between_primary_speed)
+
+        # associates (index, index) pairs of primary cities of the same country to the city
+        # between them, when going through it is faster than the direct trip
+        self.via_cities = dict()
+        for country_name, indexes in self.country_primaries.items():
+            others = [
+                city
+                for city in Country.countries_and_their_cities[country_name]
+                if city.city_type != "primary"
+            ]
+            if len(indexes) < 2 or not others:
+                continue
+
+            other_latitudes, other_longitudes = coordinates_of(others)
+            hours = np.ceil(
+                ceil_great_circle_km(
+                    latitudes[indexes, np.newaxis],
+                    longitudes[indexes, np.newaxis],
+                    other_latitudes[np.newaxis, :],
+                    other_longitudes[np.newaxis, :],
+                )
+                / in_country_speed
+            )
+            # two_hops[i, j, k] is the time from primary i to primary j through city k
+            two_hops = hours[:, np.newaxis, :] + hours[np.newaxis, :, :]
+            best = two_hops.argmin(axis=2)
+            for i, first in enumerate(indexes):
+                for j, second in enumerate(indexes):
+                    if first != second and two_hops[i, j, best[i, j]] < travel_times[first, second]:
+                        travel_times[first, second] = two_hops[i, j, best[i, j]]
+                        self.via_cities[(first, second)] = others[best[i, j]]
+
+        # the Floyd-Warshall algorithm, as in travel_tables.compute_travel_table
+        predecessors = np.repeat(np.arange(size, dtype=np.int32)[:, np.newaxis], size, axis=1)
+        np.fill_diagonal(travel_times, 0)
+        np.fill_diagonal(predecessors, NO_PREDECESSOR)
+        for middle in range(size):
+            through_middle = travel_times[:, middle, np.newaxis] + travel_times[middle, :]
+            shorter = through_middle < travel_times
+            np.minimum(travel_times, through_middle, out=travel_times)
+            np.copyto(predecessors, predecessors[middle, :], where=shorter)
+
+        self.travel_times = travel_times
+        self.predecessors = predecessors
+
+        # any primary city reaches all the primary cities, and all the cities of their countries
+        reachable = dict.fromkeys(self.primaries)
+        for country_name in self.country_primaries:
+            reachable.update(dict.fromkeys(Country.countries_and_their_cities[country_name]))
+        self.backbone_cities = list(reachable)
+        self.backbone_city_ids = {city.city_id for city in self.backbone_cities}
+
+    def access(self, city: City) -> tuple[list[int], np.ndarray]:
+        """
+        Returns the primary cities a path from (or to) a city can go through first (or last),
+        and the travel times of the direct trips between them and the city.
+
+        :param city: the city.
+        :return: the indexes of the primary cities, and the travel times in hours.
+        """
+        if city.city_type == "primary":
+            return [self.primary_indexes[city.city_id]], np.zeros(1)
+
+        country = find_country_of_city(city)
+        indexes = [] if country is None else self.country_primaries.get(country.name, [])
+        if not indexes:
+            return [], np.zeros(0)
+
+        latitudes, longitudes = coordinates_of([self.primaries[index] for index in indexes])
+        latitude, longitude = coordinates_of([city])
+        hours = np.ceil(
+            ceil_great_circle_km(latitude, longitude, latitudes, longitudes)
+            / self.vehicle.in_country_speed
+        )
+        return indexes, hours
+
+    def backbone_path(self, first: int, last: int) -> list[City]:
+        """
+        Returns the cities of a shortest path between two primary cities.
+
+        :param first: the index of the departure primary city.
+        :param last: the index of the arrival primary city.
+        :return: the cities of the path, both ends included.
+        """
+        path = [self.primaries[last]]
+        index = last
+        while index != first:
+            previous = int(self.predecessors[first, index])
+            if (previous, index) in self.via_cities:
+                path.append(self.via_cities[(previous, index)])
+            path.append(self.primaries[previous])
+            index = previous
+        path.reverse()
+        return path
+
+    def shortest_path(self, from_city: City, to_city: City) -> Itinerary | None:
+        """
+        Returns a shortest path between two cities as an Itinerary, or None if there is no path.
+        The travel time is the same as on the graph of all the cities,
+        but another path may be chosen between paths of the same travel time.
+
+        :param from_city: the departure city.
+        :param to_city: the arrival city.
+        :return: a shortest path from departure to arrival, or None if there is none.
+        """
+        if from_city is to_city:
+            return Itinerary([from_city])
+
+        best_time = self.vehicle.compute_travel_time(from_city, to_city)
+        best_path = [from_city, to_city]
+
+        from_indexes, from_hours = self.access(from_city)
+        to_indexes, to_hours = self.access(to_city)
+        if from_indexes and to_indexes:
+            # the best combination of the primary cities at both ends
+            totals = (
+                from_hours[:, np.newaxis]
+                + self.travel_times[np.ix_(from_indexes, to_indexes)]
+                + to_hours[np.newaxis, :]
+            )
+            i, j = np.unravel_index(totals.argmin(), totals.shape)
+            if totals[i, j] < best_time:
+                best_time = totals[i, j]
+                best_path = self.backbone_path(from_indexes[i], to_indexes[j])
+                if best_path[0] is not from_city:
+                    best_path.insert(0, from_city)
+                if best_path[-1] is not to_city:
+                    best_path.append(to_city)
+
+        if best_time == math.inf:
+            return None
+        return Itinerary(best_path)
+
+    def reachable_cities(self, from_city: City) -> list[City]:
+        """
+        Returns the cities that can be reached from a city, directly or not,
+        including the city itself.
+
+        :param from_city: the departure city.
+        :return: the reachable cities, in no particular order.
+        """
+        if from_city.city_id in self.backbone_city_ids:
+            return list(self.backbone_cities)
+
+        # the city can only travel inside its country, which has no primary city
+        country = find_country_of_city(from_city)
+        if country is None:
+            return [from_city]
+        return list(Country.countries_and_their_cities[country.name])
+
+
+def get_router(vehicle: DiplomacyDonutDinghy) -> HierarchicalRouter:
+    """
+    Returns the router of a vehicle, reusing the router of a vehicle with the same speeds
+    if no city was added since. The ROUTER_CACHE_SIZE most recently used routers are kept.
+
+    :param vehicle: the vehicle.
+    :return: the router.
+    """
+    global router_cache_version
+
+    version = (City.registry_version, Country.registry_version)
+    if version != router_cache_version:
+        router_cache.clear()
+        router_cache_version = version
+
+    key = (vehicle.in_country_speed, vehicle.between_primary_speed)
+    if key in router_cache:
+        router_cache.move_to_end(key)
+        return router_cache[key]
+
+    with stats.timed("build_router"):
+        router = HierarchicalRouter(vehicle)
+    router_cache[key] = router
+    if len(router_cache) > ROUTER_CACHE_SIZE:
+        router_cache.popitem(last=False)
+
+    return router
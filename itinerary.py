@@ -1,33 +1,189 @@
-from math import radians, cos, sin, asin, sqrt
+from array import array
+from collections.abc import MutableSequence
+import numpy as np
 from city import City, create_example_cities, get_cities_by_name
+from distance_matrix import DistanceMatrix, ceil_great_circle_km
+from tour_optimization import DEFAULT_NEIGHBOURS, DEFAULT_TIME_BUDGET, TourOptimizer
+
+
+class CityList(MutableSequence):
+    """
+    A list of cities counting its changes, so that an itinerary knows when
+    the distances of its legs must be computed again.
+    Every change goes through __setitem__, __delitem__ or insert,
+    the other methods of a list are built on them by MutableSequence.
+    """
+
+    def __init__(self, cities: list[City] = ()) -> None:
+        """
+        Creates a list with the given cities.
+        :param cities: a sequence of cities, possibly empty.
+        :return: None
+        """
+        self.data = list(cities)
+        # incremented by every change of the list
+        self.version = 0
+
+    def __getitem__(self, index):
+        """
+        Returns a city, or a list of cities for a slice.
+        :param index: an index or a slice.
+        :return: the city or the cities.
+        """
+        return self.data[index]
+
+    def __setitem__(self, index, cities) -> None:
+        """
+        Replaces a city, or the cities of a slice.
+        :param index: an index or a slice.
+        :param cities: the city, or the cities for a slice.
+        :return: None
+        """
+        self.data[index] = cities
+        self.version += 1
+
+    def __delitem__(self, index) -> None:
+        """
+        Removes a city, or the cities of a slice.
+        :param index: an index or a slice.
+        :return: None
+        """
+        del self.data[index]
+        self.version += 1
+
+    def __len__(self) -> int:
+        """
+        Returns the number of cities.
+        :return: the number of cities.
+        """
+        return len(self.data)
+
+    def __iter__(self):
+        """
+        Returns an iterator over the cities, faster than the one of MutableSequence.
+        :return: the iterator.
+        """
+        return iter(self.data)
+
+    def insert(self, index: int, city: City) -> None:
+        """
+        Inserts a city before an index.
+        :param index: the index.
+        :param city: the city.
+        :return: None
+        """
+        self.data.insert(index, city)
+        self.version += 1
+
+    def sort(self, *args, **kwargs) -> None:
+        """
+        Sorts the cities in place, as list.sort.
+        :return: None
+        """
+        self.data.sort(*args, **kwargs)
+        self.version += 1
+
+    def __eq__(self, other) -> bool:
+        """
+        Compares the cities with the ones of another CityList or list.
+        :param other: the other list.
+        :return: whether the cities are the same, in the same order.
+        """
+        if isinstance(other, CityList):
+            other = other.data
+        return self.data == other
+
+    def __repr__(self) -> str:
+        """
+        Returns the cities as a list would.
+        :return: the representation of the list of cities.
+        """
+        return repr(self.data)
 
 
 class Itinerary:
     """
     A sequence of cities.
+    The distances between successive cities (legs) are kept along with the cities,
+    and computed again whenever the cities are changed in another way than
+    through the methods of the itinerary.
     """
 
     def __init__(self, cities: list[City]) -> None:
         """
-        Creates an itinerary with the provided sequence of cities,
+        Creates an itinerary with a copy of the provided sequence of cities,
         conserving order.
         :param cities: a sequence of cities, possibly empty.
         :return: None
         """
         self.cities = cities
 
+        # the coordinates of the cities, and leg_distances[i] is the distance between
+        # cities i and i + 1. They are computed when first needed
+        self.latitudes = None
+        self.longitudes = None
+        self.leg_distances = None
+        self.distance_total = 0
+
+    @property
+    def cities(self) -> CityList:
+        """
+        The cities of the itinerary, in order.
+        """
+        return self.city_list
+
+    @cities.setter
+    def cities(self, cities: list[City]) -> None:
+        # the list is copied, so that changing the given list does not change the itinerary
+        self.city_list = CityList(cities)
+        # the version of the list the legs were computed for, none yet
+        self.legs_version = None
+
+    def update_legs(self) -> None:
+        """
+        Computes the distances of all the legs at once, if they were not computed yet
+        or if the cities were changed without the methods of the itinerary.
+        :return: None.
+        """
+        if self.legs_version == self.city_list.version:
+            return
+
+        self.latitudes = array("d", [city.coordinates[0] for city in self.cities])
+        self.longitudes = array("d", [city.coordinates[1] for city in self.cities])
+
+        self.leg_distances = array("q")
+        if len(self.cities) > 1:
+            latitudes = np.array(self.latitudes)
+            longitudes = np.array(self.longitudes)
+            self.leg_distances.extend(
+                ceil_great_circle_km(
+                    latitudes[:-1], longitudes[:-1], latitudes[1:], longitudes[1:]
+                ).tolist()
+            )
+        self.distance_total = sum(self.leg_distances)
+        self.legs_version = self.city_list.version
+
+    def distances_to_cities(self, city: City) -> np.ndarray:
+        """
+        Returns the distances between a city and each city of the itinerary.
+        :param city: the city to measure the distances from.
+        :return: the distances in km, in the order of the itinerary.
+        """
+        return ceil_great_circle_km(
+            city.coordinates[0],
+            city.coordinates[1],
+            np.frombuffer(self.latitudes),
+            np.frombuffer(self.longitudes),
+        )
+
     def total_distance(self) -> int:
         """
         Returns the total distance (in km) of the itinerary, which is
         the sum of the distances between successive cities.
         :return: the total distance.
         """
-        distance_total = 0
-        for index in range(0, len(self.cities)):
-            if index + 1 < len(self.cities):
-                distance_total += self.cities[index].distance(self.cities[index + 1])
-
-        return distance_total
+        self.update_legs()
+        return self.distance_total
 
     def append_city(self, city: City) -> None:
         """
@@ -35,7 +191,17 @@ class Itinerary:
         :param city: the city to append
         :return: None.
         """
+        self.update_legs()
+
+        if self.cities:
+            leg_distance = self.cities[-1].distance(city)
+            self.leg_distances.append(leg_distance)
+            self.distance_total += leg_distance
+
         self.cities.append(city)
+        self.latitudes.append(city.coordinates[0])
+        self.longitudes.append(city.coordinates[1])
+        self.legs_version = self.city_list.version
 
     def min_distance_insert_city(self, city: City) -> None:
         """
@@ -44,33 +210,63 @@ class Itinerary:
         :param city: the city to insert
         :return: None.
         """
-        min_distance = float("inf")
-        best_index = 0
-
-        # the reason the range +1 because the loop includes an additional iteration that allows for the new city to be compared to th elast city in the iternery
-        # find the minimum distance as well as the best index to insert the city in the certain path
-        for index in range(len(self.cities) + 1):
-            new_distance = 0
-            if index == 0:
-                new_distance = city.distance(self.cities[0])
-            elif index == len(self.cities):
-                new_distance = city.distance(self.cities[-1])
-            else:
-                # the first value calculates the distance between city and the prevous city
-                # the second value calculates distance between city and the next city
-                # the third value calculates the distance between previous city and next city
-                # we subtract to see what is the new distance if the city is inserted at this index
-                new_distance = (
-                    city.distance(self.cities[index - 1])
-                    + city.distance(self.cities[index])
-                    - self.cities[index - 1].distance(self.cities[index])
-                )
-
-            if new_distance < min_distance:
-                min_distance = new_distance
-                best_index = index
+        self.update_legs()
+        if not self.cities:
+            self.append_city(city)
+            return
+
+        distances = self.distances_to_cities(city)
+
+        # the extra distance of inserting the city at each index, computed all at once:
+        # at the start it adds a leg to the first city, at the end a leg from the last city.
+        # In between, the city replaces the leg between the previous and the next city
+        # by a leg from the previous city and a leg to the next city
+        added_distances = np.empty(len(self.cities) + 1, dtype=np.int64)
+        added_distances[0] = distances[0]
+        added_distances[-1] = distances[-1]
+        added_distances[1:-1] = (
+            distances[:-1]
+            + distances[1:]
+            - np.frombuffer(self.leg_distances, dtype=np.int64)
+        )
+
+        # the first index with the minimum distance
+        best_index = int(np.argmin(added_distances))
+
+        if best_index == 0:
+            self.leg_distances.insert(0, int(distances[0]))
+        elif best_index == len(self.cities):
+            self.leg_distances.append(int(distances[-1]))
+        else:
+            self.leg_distances[best_index - 1] = int(distances[best_index - 1])
+            self.leg_distances.insert(best_index, int(distances[best_index]))
+        self.distance_total += int(added_distances[best_index])
 
         self.cities.insert(best_index, city)
+        self.latitudes.insert(best_index, city.coordinates[0])
+        self.longitudes.insert(best_index, city.coordinates[1])
+        self.legs_version = self.city_list.version
+
+    def optimize(
+        self, time_budget: float = DEFAULT_TIME_BUDGET, neighbours: int = DEFAULT_NEIGHBOURS
+    ) -> list[tuple[float, int]]:
+        """
+        Reorders the cities to make the total distance as small as possible in the given time,
+        with 2-opt and Or-opt moves between close cities (see TourOptimizer).
+        The first city stays first, the last city can change.
+        :param time_budget: the time to spend in seconds.
+        :param neighbours: the number of closest cities each city may be moved next to.
+        :return: the total distance of the best order found over time,
+                 as a list of (seconds since the start, total distance).
+        """
+        distances = DistanceMatrix(self.cities).distances
+        optimizer = TourOptimizer(distances, neighbours)
+        tour, history = optimizer.optimize(list(range(len(self.cities))), time_budget)
+
+        self.cities[:] = [self.cities[index] for index in tour]
+        self.update_legs()
+
+        return history
 
     def __str__(self) -> str:
         """
@@ -80,15 +276,16 @@ class Itinerary:
         :return: a string representing the itinerary.
         """
         route = ""
+        total_distance = self.total_distance()
         if len(self.cities) == 0:
-            route = "(" + str(Itinerary.total_distance(self)) + " km)"
+            route = "(" + str(total_distance) + " km)"
             return route
 
         for index, city in enumerate(self.cities):
             if index != len(self.cities) - 1:
                 route += city.name + " -> "
             else:
-                route += city.name + " (" + str(Itinerary.total_distance(self)) + " km)"
+                route += city.name + " (" + str(total_distance) + " km)"
 
         return route
 
@@ -112,6 +309,10 @@ if __name__ == "__main__":
     test_itin.min_distance_insert_city(get_cities_by_name("Canberra")[0])
     print(test_itin)
 
+    # we try reordering the cities
+    test_itin.optimize(time_budget=0.1)
+    print(test_itin)
+
     # city1 = City('Melbourne', (-37.8136, 144.9631), 'primary', 1000000, 1)
     # city2 = City('Sydney', (-33.8688, 151.2093), 'primary', 5000000, 2)
     # city3 = City('Brisbane', (-27.4698, 153.0251), 'primary', 2000000, 3)
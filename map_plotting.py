@@ -1,53 +1,237 @@
-from mpl_toolkits.basemap import Basemap
-import matplotlib.pyplot as plt
+import hashlib
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterator
+import numpy as np
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection, PolyCollection
 from itinerary import Itinerary
 from city import City, create_example_cities, get_cities_by_name
 
+# the resolution of the cached base layer, in pixels per degree
+BASE_LAYER_RESOLUTION = 10
 
-def plot_itinerary(
-    itinerary: Itinerary, projection="robin", line_width=2, colour="b"
+# the part of the file names made of the city names is shortened above this length
+MAX_FILENAME_LENGTH = 200
+
+# the coastlines, borders and land of the vector renderer, made by build_vector_layer
+VECTOR_LAYER_PATH = "map_vector_layer.npz"
+
+# the largest distance in degrees between a simplified line and the original one
+SIMPLIFY_TOLERANCE = 0.05
+
+# the types of the land polygons of Basemap that are lakes (the others are land)
+LAKE_TYPES = (2, 4)
+
+# the vector layer loaded by get_vector_layer
+vector_layer = None
+
+# the base layer drawn by get_base_layer, and the resolution it was drawn at
+base_layer = None
+base_layer_resolution = None
+
+# the renderers used by plot_itinerary, by name, created when first needed
+default_renderers = dict()
+
+# the renderer of a worker process of render_itineraries
+worker_renderer = None
+
+# number of itineraries sent to a worker of render_itineraries at once
+ROUTES_PER_TASK = 8
+
+
+def draw_base_layer(resolution: int = BASE_LAYER_RESOLUTION) -> np.ndarray:
+    """
+    Draws the static part of the map of the whole world (coastlines, countries, states,
+    continents and oceans) with Basemap, in the equirectangular ("cyl") projection.
+
+    :param resolution: the number of pixels per degree.
+    :return: the image of the map as an array of RGBA pixels, from the north-west corner.
+    """
+    # Basemap is slow to import and only needed to draw the base layer
+    from mpl_toolkits.basemap import Basemap
+
+    figure = Figure(figsize=(360 * resolution / 100, 180 * resolution / 100), dpi=100)
+    canvas = FigureCanvasAgg(figure)
+    axes = figure.add_axes((0, 0, 1, 1))
+    # the background of the axes is the colour of the oceans, so it stays visible
+    axes.set_xticks([])
+    axes.set_yticks([])
+    for spine in axes.spines.values():
+        spine.set_visible(False)
+
+    m = Basemap(
+        projection="cyl",
+        resolution="c",
+        llcrnrlon=-180,
+        llcrnrlat=-90,
+        urcrnrlon=180,
+        urcrnrlat=90,
+        ax=axes,
+    )
+    m.drawcoastlines()
+    m.drawcountries(linewidth=0.5)
+    m.drawstates(linewidth=0.5)
+    m.fillcontinents(color="tan", lake_color="lightblue")
+    m.drawmapboundary(fill_color="lightblue")
+
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+
+def get_base_layer(resolution: int = BASE_LAYER_RESOLUTION) -> np.ndarray:
+    """
+    Returns the static part of the map, drawing it the first time it is needed.
+
+    :param resolution: the number of pixels per degree.
+    :return: the image of the map (see draw_base_layer).
+    """
+    global base_layer, base_layer_resolution
+
+    if base_layer is None or base_layer_resolution != resolution:
+        base_layer = draw_base_layer(resolution)
+        base_layer_resolution = resolution
+
+    return base_layer
+
+
+def simplify_polyline(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Removes the points of a line that are closer than the tolerance to the simplified line
+    (Douglas-Peucker algorithm). The first and last points are kept.
+
+    :param points: the points of the line, as an array of shape (n, 2).
+    :param tolerance: the largest distance between the simplified line and a removed point.
+    :return: the points that are kept, in order.
+    """
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+
+    sections = [(0, len(points) - 1)]
+    while sections:
+        first, last = sections.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        direction = end - start
+        length = np.hypot(*direction)
+        offsets = points[first + 1 : last] - start
+        if length == 0:
+            distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        else:
+            distances = np.abs(offsets[:, 0] * direction[1] - offsets[:, 1] * direction[0]) / length
+
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            sections.append((first, middle))
+            sections.append((middle, last))
+
+    return points[keep]
+
+
+def build_vector_layer(
+    path: str = VECTOR_LAYER_PATH, tolerance: float = SIMPLIFY_TOLERANCE
 ) -> None:
     """
-    Plots an itinerary on a map and writes it to a file.
-    Ensures a size of at least 50 degrees in each direction.
-    Ensures the cities are not on the edge of the map by padding by 5 degrees.
-    The name of the file is map_city1_city2_city3_..._cityX.png.
+    Saves the coastlines, country borders, state borders and land polygons of Basemap
+    (crude resolution), simplified, into a NumPy file used by the vector renderer.
+    Each set of lines is stored as the concatenation of their points (longitude, latitude)
+    and the offsets of the first point of each line.
+    The file shipped with the project was made with this function.
 
-    :param itinerary: The itinerary to plot.
-    :param projection: The map projection to use.
-    :param line_width: The width of the line to draw.
-    :param colour: The colour of the line to draw.
+    :param path: the path of the file.
+    :param tolerance: the tolerance of the simplification in degrees (see simplify_polyline).
+    :return: None
     """
+    from mpl_toolkits.basemap import Basemap
 
-    # Setting up the workspace for the map
-    plt.figure(figsize=(12, 8))
-    plt.title("World Map")
-
-    # Creating the map
-    m = Basemap(projection="cyl", resolution="c")
-
-    lats, lons = [], []
-    order = 0
-    ##
-    for city in itinerary.cities:
-        # lat
-        lats.append(city.coordinates[0])
-        # lng
-        lons.append(city.coordinates[1])
-        order += 1
-        # adding name of city
-        plt.text(
-            city.coordinates[1],
-            city.coordinates[0],
-            f"{city.name} ({order})",
-            fontsize=7,
-            style="italic",
-            fontweight="bold",
-            ha="left",
-            va="top",
-            color="red",
+    axes = Figure().add_subplot()
+    m = Basemap(
+        projection="cyl",
+        resolution="c",
+        llcrnrlon=-180,
+        llcrnrlat=-90,
+        urcrnrlon=180,
+        urcrnrlat=90,
+        ax=axes,
+    )
+    m.drawcountries()
+    m.drawstates()
+
+    layers = {
+        "coastlines": m.coastsegs,
+        "borders": m.cntrysegs,
+        "states": m.statesegs,
+        "land": [list(zip(*polygon)) for polygon in m.coastpolygons],
+    }
+
+    arrays = {"land_types": np.array(m.coastpolygontypes, dtype=np.int8)}
+    for name, lines in layers.items():
+        simplified = [simplify_polyline(np.array(line, dtype=float), tolerance) for line in lines]
+        arrays[name + "_points"] = np.concatenate(simplified).astype(np.float32)
+        arrays[name + "_offsets"] = np.cumsum([0] + [len(line) for line in simplified]).astype(
+            np.int32
         )
 
+    np.savez_compressed(path, **arrays)
+
+
+def get_vector_layer(path: str = VECTOR_LAYER_PATH) -> dict[str, list[np.ndarray]]:
+    """
+    Returns the lines of the vector renderer, loading them the first time they are needed.
+
+    :param path: the path of the file made by build_vector_layer.
+    :return: associates "coastlines", "borders", "states" and "land" to their lines,
+             each an array of points (longitude, latitude), and "land_types" to the
+             Basemap type of each land polygon.
+    """
+    global vector_layer
+
+    if vector_layer is None:
+        with np.load(os.path.join(os.path.dirname(os.path.abspath(__file__)), path)) as arrays:
+            vector_layer = {"land_types": arrays["land_types"].tolist()}
+            for name in ("coastlines", "borders", "states", "land"):
+                points, offsets = arrays[name + "_points"], arrays[name + "_offsets"]
+                vector_layer[name] = [
+                    points[start:end] for start, end in zip(offsets[:-1], offsets[1:])
+                ]
+
+    return vector_layer
+
+
+def itinerary_route(itinerary: Itinerary) -> tuple[list[str], list[tuple[float, float]]]:
+    """
+    Returns the data of an itinerary needed to draw it, which can be sent to other processes
+    without the City instances.
+
+    :param itinerary: the itinerary.
+    :return: the names and the coordinates (latitude, longitude) of the cities, in order.
+    """
+    return (
+        [city.name for city in itinerary.cities],
+        [city.coordinates for city in itinerary.cities],
+    )
+
+
+def map_extent(coordinates: list[tuple[float, float]]) -> tuple[float, float, float, float]:
+    """
+    Returns the part of the world to show for the cities of an itinerary.
+    Ensures a size of at least 50 degrees in each direction.
+    Ensures the cities are not on the edge of the map by padding by 5 degrees.
+    Moves the part shown inside the world if needed.
+
+    :param coordinates: the coordinates (latitude, longitude) of the cities.
+    :return: the minimum and maximum longitudes, and the minimum and maximum latitudes.
+    """
+    lats = [latitude for latitude, _ in coordinates]
+    lons = [longitude for _, longitude in coordinates]
+
     # Adding padding of 5 degrees.
     lat_min, lat_max = min(lats) - 5, max(lats) + 5
     lon_min, lon_max = min(lons) - 5, max(lons) + 5
@@ -60,19 +244,381 @@ def plot_itinerary(
         lat_mid = (lat_min + lat_max) / 2
         lat_min, lat_max = lat_mid - 25, lat_mid + 25
 
-    m.drawcoastlines()
-    m.drawcountries(linewidth=0.5)
-    m.drawstates(linewidth=0.5)
-    m.fillcontinents(color="tan", lake_color="lightblue")
-    m.drawmapboundary(fill_color="lightblue")
+    # the base layer stops at the edges of the world
+    lon_min, lon_max = (
+        lon_min + max(-180 - lon_min, 0) - max(lon_max - 180, 0),
+        lon_max + max(-180 - lon_min, 0) - max(lon_max - 180, 0),
+    )
+    lat_min, lat_max = (
+        lat_min + max(-90 - lat_min, 0) - max(lat_max - 90, 0),
+        lat_max + max(-90 - lat_min, 0) - max(lat_max - 90, 0),
+    )
+
+    return max(lon_min, -180), min(lon_max, 180), max(lat_min, -90), min(lat_max, 90)
+
+
+def map_filename(names: list[str]) -> str:
+    """
+    Returns the name of the file of the map of an itinerary: map_city1_city2_city3_..._cityX.png.
+    The characters of the city names that are not letters, digits or dashes are replaced
+    by underscores, and a long name is shortened and ends with a hash of the full name.
 
-    x, y = m(lons, lats)
-    m.plot(x, y, linewidth=line_width, color=colour)
+    :param names: the names of the cities of the itinerary.
+    :return: the file name.
+    """
+    names = "_".join(re.sub(r"[^\w-]+", "_", name) for name in names)
+    if len(names) > MAX_FILENAME_LENGTH:
+        digest = hashlib.sha256(names.encode()).hexdigest()[:12]
+        names = names[: MAX_FILENAME_LENGTH - len(digest) - 1] + "_" + digest
+    return f"map_{names}.png"
+
+
+class ItineraryRenderer:
+    """
+    Draws itineraries on a map, one after the other, reusing the same figure.
+    The static part of the map is drawn once as an image (see get_base_layer),
+    only the route and the names of the cities are drawn for each itinerary.
+    """
+
+    def __init__(
+        self, base: np.ndarray = None, figsize: tuple[float, float] = (12, 8), dpi: int = 100
+    ) -> None:
+        """
+        Creates the figure the itineraries are drawn on.
+
+        :param base: the image of the static part of the map, get_base_layer() by default.
+        :param figsize: the size of the images in inches.
+        :param dpi: the number of pixels per inch of the images.
+        :return: None
+        """
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot()
+        self.axes.set_title("World Map")
+        self.draw_background(base)
+
+        # the lines and texts of the last itinerary drawn
+        self.route_artists = []
+
+    def draw_background(self, base: np.ndarray = None) -> None:
+        """
+        Draws the static part of the map.
+
+        :param base: the image of the static part of the map, get_base_layer() by default.
+        :return: None
+        """
+        if base is None:
+            base = get_base_layer()
+        self.base = base
+        # the number of pixels per degree of the base layer
+        self.resolution = base.shape[1] / 360
+
+        self.image = self.axes.imshow(
+            base, extent=(-180, 180, -90, 90), origin="upper", interpolation="bilinear"
+        )
+
+    def show_extent(
+        self, lon_min: float, lon_max: float, lat_min: float, lat_max: float
+    ) -> None:
+        """
+        Shows a part of the map.
+
+        :param lon_min: the minimum longitude.
+        :param lon_max: the maximum longitude.
+        :param lat_min: the minimum latitude.
+        :param lat_max: the maximum latitude.
+        :return: None
+        """
+        # only the part of the base layer that is shown is resampled
+        first_column = max(int((lon_min + 180) * self.resolution) - 1, 0)
+        last_column = min(int((lon_max + 180) * self.resolution) + 2, self.base.shape[1])
+        first_row = max(int((90 - lat_max) * self.resolution) - 1, 0)
+        last_row = min(int((90 - lat_min) * self.resolution) + 2, self.base.shape[0])
+        self.image.set_data(self.base[first_row:last_row, first_column:last_column])
+        self.image.set_extent(
+            (
+                first_column / self.resolution - 180,
+                last_column / self.resolution - 180,
+                90 - last_row / self.resolution,
+                90 - first_row / self.resolution,
+            )
+        )
+        self.axes.set_xlim(lon_min, lon_max)
+        self.axes.set_ylim(lat_min, lat_max)
+
+    def render(
+        self, itinerary: Itinerary, line_width=2, colour="b", filename: str = None
+    ) -> str:
+        """
+        Draws an itinerary and writes the map to a file.
+
+        :param itinerary: The itinerary to plot.
+        :param line_width: The width of the line to draw.
+        :param colour: The colour of the line to draw.
+        :param filename: The path of the file, map_filename of the city names by default.
+        :return: The path of the file.
+        """
+        names, coordinates = itinerary_route(itinerary)
+        return self.render_route(names, coordinates, line_width, colour, filename)
+
+    def render_route(
+        self,
+        names: list[str],
+        coordinates: list[tuple[float, float]],
+        line_width=2,
+        colour="b",
+        filename: str = None,
+    ) -> str:
+        """
+        Draws the route of an itinerary (see itinerary_route) and writes the map to a file.
+
+        :param names: The names of the cities.
+        :param coordinates: The coordinates (latitude, longitude) of the cities.
+        :param line_width: The width of the line to draw.
+        :param colour: The colour of the line to draw.
+        :param filename: The path of the file, map_filename(names) by default.
+        :return: The path of the file.
+        """
+        for artist in self.route_artists:
+            artist.remove()
+        self.route_artists = []
+
+        lats, lons = [], []
+        for order, (name, (latitude, longitude)) in enumerate(zip(names, coordinates), start=1):
+            lats.append(latitude)
+            lons.append(longitude)
+            # adding name of city
+            self.route_artists.append(
+                self.axes.text(
+                    longitude,
+                    latitude,
+                    f"{name} ({order})",
+                    fontsize=7,
+                    style="italic",
+                    fontweight="bold",
+                    ha="left",
+                    va="top",
+                    color="red",
+                    clip_on=True,
+                )
+            )
+        self.route_artists.extend(
+            self.axes.plot(lons, lats, linewidth=line_width, color=colour)
+        )
+
+        self.show_extent(*map_extent(coordinates))
+
+        if filename is None:
+            filename = map_filename(names)
+        self.figure.savefig(filename)
+        return filename
+
+
+class VectorItineraryRenderer(ItineraryRenderer):
+    """
+    Draws itineraries like ItineraryRenderer, but the static part of the map is drawn from
+    the simplified lines of the vector layer (see build_vector_layer) instead of Basemap.
+    """
+
+    def draw_background(self, base: dict[str, list[np.ndarray]] = None) -> None:
+        """
+        Draws the static part of the map.
+
+        :param base: the lines of the static part of the map, get_vector_layer() by default.
+        :return: None
+        """
+        if base is None:
+            base = get_vector_layer()
+
+        self.axes.set_facecolor("lightblue")
+        self.axes.set_aspect("equal")
+        self.axes.add_collection(
+            PolyCollection(
+                base["land"],
+                facecolors=[
+                    "lightblue" if land_type in LAKE_TYPES else "tan"
+                    for land_type in base["land_types"]
+                ],
+                edgecolors="none",
+                zorder=1,
+            )
+        )
+        self.axes.add_collection(
+            LineCollection(base["coastlines"], colors="black", linewidths=1, zorder=1.5)
+        )
+        self.axes.add_collection(
+            LineCollection(base["borders"], colors="black", linewidths=0.5, zorder=1.5)
+        )
+        self.axes.add_collection(
+            LineCollection(base["states"], colors="black", linewidths=0.5, zorder=1.5)
+        )
+
+    def show_extent(
+        self, lon_min: float, lon_max: float, lat_min: float, lat_max: float
+    ) -> None:
+        """
+        Shows a part of the map.
+
+        :param lon_min: the minimum longitude.
+        :param lon_max: the maximum longitude.
+        :param lat_min: the minimum latitude.
+        :param lat_max: the maximum latitude.
+        :return: None
+        """
+        self.axes.set_xlim(lon_min, lon_max)
+        self.axes.set_ylim(lat_min, lat_max)
+
+
+# the renderers that plot_itinerary can use
+RENDERERS = {"basemap": ItineraryRenderer, "vector": VectorItineraryRenderer}
+
+
+def get_renderer(renderer: str) -> ItineraryRenderer:
+    """
+    Returns the renderer with the given name, creating it the first time it is needed.
 
-    # Saving the map
-    #   filename = f"map_{'_'.join(itinerary)}.png"
-    filename = "test.png"
-    plt.savefig(filename)
+    :param renderer: "basemap" or "vector" (see RENDERERS).
+    :return: the renderer.
+    """
+    if renderer not in RENDERERS:
+        raise ValueError("unknown renderer " + str(renderer))
+
+    if renderer not in default_renderers:
+        default_renderers[renderer] = RENDERERS[renderer]()
+    return default_renderers[renderer]
+
+
+def plot_itinerary(
+    itinerary: Itinerary, projection="robin", line_width=2, colour="b", renderer="basemap"
+) -> str:
+    """
+    Plots an itinerary on a map and writes it to a file.
+    Ensures a size of at least 50 degrees in each direction.
+    Ensures the cities are not on the edge of the map by padding by 5 degrees.
+    The name of the file is map_city1_city2_city3_..._cityX.png.
+
+    :param itinerary: The itinerary to plot.
+    :param projection: The map projection to use. Only the equirectangular projection
+                       of the cached base layer is supported, so it is ignored.
+    :param line_width: The width of the line to draw.
+    :param colour: The colour of the line to draw.
+    :param renderer: "basemap" to draw the map with Basemap, or "vector" to draw it from
+                     the simplified lines of the vector layer, which is faster and does not
+                     need Basemap.
+    :return: The name of the file.
+    """
+    return get_renderer(renderer).render(itinerary, line_width, colour)
+
+
+def plot_itineraries(
+    itineraries: list[Itinerary], line_width=2, colour="b", renderer="basemap"
+) -> list[str]:
+    """
+    Plots itineraries on maps, each written to its own file (see plot_itinerary).
+
+    :param itineraries: The itineraries to plot.
+    :param line_width: The width of the lines to draw.
+    :param colour: The colour of the lines to draw.
+    :param renderer: The name of the renderer (see plot_itinerary).
+    :return: The names of the files, in the order of the itineraries.
+    """
+    return [
+        plot_itinerary(itinerary, line_width=line_width, colour=colour, renderer=renderer)
+        for itinerary in itineraries
+    ]
+
+
+def start_render_worker(renderer: str = "basemap") -> None:
+    """
+    Creates the renderer of a worker process of render_itineraries.
+    The base layer is inherited from the parent process if it was forked,
+    and drawn (or loaded) by the worker otherwise.
+
+    :param renderer: the name of the renderer (see plot_itinerary).
+    :return: None
+    """
+    global worker_renderer
+
+    worker_renderer = RENDERERS[renderer]()
+
+
+def render_routes(
+    routes: list[tuple[list[str], list[tuple[float, float]]]],
+    directory: str,
+    line_width=2,
+    colour="b",
+) -> list[str]:
+    """
+    Draws routes (see itinerary_route) in a worker process of render_itineraries.
+
+    :param routes: the routes.
+    :param directory: the directory where the maps are written.
+    :param line_width: The width of the lines to draw.
+    :param colour: The colour of the lines to draw.
+    :return: the paths of the maps, in the order of the routes.
+    """
+    return [
+        worker_renderer.render_route(
+            names, coordinates, line_width, colour, os.path.join(directory, map_filename(names))
+        )
+        for names, coordinates in routes
+    ]
+
+
+def render_itineraries(
+    itineraries: list[Itinerary],
+    directory: str = ".",
+    workers: int = None,
+    line_width=2,
+    colour="b",
+    routes_per_task: int = ROUTES_PER_TASK,
+    renderer: str = "basemap",
+) -> Iterator[str]:
+    """
+    Draws many itineraries with a pool of processes, each writing its maps to a directory
+    (see plot_itinerary). Only the names and the coordinates of the cities are sent to the
+    workers, and each of them creates its renderer once.
+    The maps are drawn with the Agg backend, without any window.
+
+    :param itineraries: The itineraries to plot.
+    :param directory: The directory where the maps are written. It is created if needed.
+    :param workers: The number of processes, the number of processors by default.
+    :param line_width: The width of the lines to draw.
+    :param colour: The colour of the lines to draw.
+    :param routes_per_task: The number of itineraries sent to a worker at once.
+    :param renderer: The name of the renderer (see plot_itinerary).
+    :return: The paths of the maps, in the order of the itineraries, as soon as they are written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    routes = [itinerary_route(itinerary) for itinerary in itineraries]
+    tasks = [
+        routes[start : start + routes_per_task]
+        for start in range(0, len(routes), routes_per_task)
+    ]
+
+    if renderer not in RENDERERS:
+        raise ValueError("unknown renderer " + str(renderer))
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        # drawn once here, instead of once in each worker
+        if renderer == "vector":
+            get_vector_layer()
+        else:
+            get_base_layer()
+    else:
+        context = multiprocessing.get_context()
+
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=start_render_worker,
+        initargs=(renderer,),
+    ) as executor:
+        for paths in executor.map(
+            render_routes, tasks, repeat(directory), repeat(line_width), repeat(colour)
+        ):
+            yield from paths
 
 
 if __name__ == "__main__":
@@ -93,4 +639,7 @@ if __name__ == "__main__":
     )
 
     # plot itinerary
-    plot_itinerary(Itinerary(city_list))
+    print(plot_itinerary(Itinerary(city_list)))
+
+    # plot it again without Basemap
+    print(plot_itinerary(Itinerary(city_list), renderer="vector"))
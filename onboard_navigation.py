@@ -1,11 +1,69 @@
+from concurrent.futures import ThreadPoolExecutor
 from city import City, get_cities_by_name
 from vehicles import Vehicle, create_example_vehicles
 from csv_parsing import create_cities_countries_from_csv
-from path_finding import find_shortest_path
-from map_plotting import plot_itinerary
+from city_search import get_city_name_index, search_cities
 
+# path_finding (networkx) and map_plotting (matplotlib and Basemap) are slow to import,
+# so they are only imported when needed, to show the first prompt sooner
+
+# number of cities suggested when a city name is not found
+SUGGESTIONS_LIMIT = 5
+
+
+def find_cities_by_input(city_name: str) -> list[City]:
+    """
+    Returns the cities with the name typed by the user.
+    If no city has exactly this name, the case, accents and punctuation are ignored.
+
+    :param city_name: the name typed by the user.
+    :return: the cities with this name, possibly none.
+    """
+    cities = get_cities_by_name(city_name)
+    if not cities:
+        cities = get_city_name_index().exact(city_name)
+    return cities
+
+
+def print_city_suggestions(city_name: str) -> None:
+    """
+    Prints the names of the cities the user may have meant
+    (the start of a name, or a misspelled name).
+
+    :param city_name: the name typed by the user.
+    """
+    suggestions = search_cities(city_name, limit=SUGGESTIONS_LIMIT)
+    if suggestions:
+        print("Did you mean: " + ", ".join(str(city) for city in suggestions) + "?")
+
+
+def prepare_routing(vehicle: Vehicle) -> None:
+    """
+    Imports the path finding module and builds what find_shortest_path needs for a vehicle
+    (see path_finding.prepare_search), so that the search is fast once the user has chosen
+    the cities.
+
+    :param vehicle: the vehicle chosen by the user.
+    :return: None
+    """
+    from path_finding import prepare_search
+
+    prepare_search(vehicle)
+
+
+def prepare_plotting() -> None:
+    """
+    Imports the plotting module.
+
+    :return: None
+    """
+    import map_plotting
+
+
+def onboard_navigation_user(background: ThreadPoolExecutor):
+    # the name index is needed as soon as the user types a city
+    name_index_ready = background.submit(get_city_name_index)
 
-def onboard_navigation_user():
     # we create some vehicles
     vehicles = create_example_vehicles()
     # create an array to hold our vehicle_options_input_list
@@ -36,33 +94,43 @@ def onboard_navigation_user():
         except ValueError:
             print("Invalid vehicle option. Please enter a valid number.")
 
+    # the graph of the vehicle is built while the user chooses the cities
+    routing_ready = background.submit(prepare_routing, vehicles[vehicle_option - 1])
+    plotting_ready = background.submit(prepare_plotting)
+    name_index_ready.result()
+
     # checks if we inputed a valid departure city
     # except catches any ValueErrors if input doesn't match the departure cities we have
     while not valid_departure_city:
         try:
-            departure_city_chosen = input("Choose a departure city: ")
-            if get_cities_by_name(departure_city_chosen):
-                departure_city_chosen = get_cities_by_name(departure_city_chosen)
+            departure_input = input("Choose a departure city: ")
+            departure_city_chosen = find_cities_by_input(departure_input)
+            if departure_city_chosen:
                 valid_departure_city = True
             else:
                 raise ValueError
         except ValueError:
             print("Invalid departure city. Please enter a valid city name.")
+            print_city_suggestions(departure_input)
 
     # checks if we inputed a valid arrival city
     # except catches any ValueErrors if input doesn't match the arrival cities we have
     while not valid_arrival_city:
         try:
-            arrival_city_chosen = input("Choose an arrival city: ")
-            if get_cities_by_name(arrival_city_chosen):
-                arrival_city_chosen = get_cities_by_name(arrival_city_chosen)
+            arrival_input = input("Choose an arrival city: ")
+            arrival_city_chosen = find_cities_by_input(arrival_input)
+            if arrival_city_chosen:
                 valid_arrival_city = True
             else:
                 raise ValueError
         except ValueError:
             print("Invalid arrival city. Please enter a valid city name.")
+            print_city_suggestions(arrival_input)
 
     # after all inputs are valid, we find the shortest path
+    routing_ready.result()
+    from path_finding import find_shortest_path
+
     itinerary = find_shortest_path(
         vehicles[vehicle_option - 1], departure_city_chosen[0], arrival_city_chosen[0]
     )
@@ -70,12 +138,35 @@ def onboard_navigation_user():
     # check if the shortest path found is not none
     #  if it isn't, we plot a map of the shortest path
     if itinerary is not None:
+        plotting_ready.result()
+        from map_plotting import plot_itinerary
+
         plot_itinerary(itinerary)
 
     exit()
 
 
-if __name__ == "__main__":
+def main(arguments: list[str] = None) -> None:
+    """
+    Loads the cities and asks the user for an itinerary to find and draw.
+
+    :param arguments: the command line arguments, sys.argv by default.
+    :return: None
+    """
+    import argparse
+    import stats
+
+    parser = argparse.ArgumentParser(description="Finds and draws itineraries between cities.")
+    stats.add_arguments(parser)
+    options = parser.parse_args(arguments)
+
     create_cities_countries_from_csv("worldcities_truncated.csv")
 
-    onboard_navigation_user()
+    # prepares the searches in the background while the user answers the prompts.
+    # A single thread runs the preparations one after the other
+    with ThreadPoolExecutor(max_workers=1) as background:
+        stats.run(options, onboard_navigation_user, background)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,119 @@
+import heapq
+import itertools
 import math
+from collections import OrderedDict
+from typing import Iterable
 import networkx
 
-from city import City, get_city_by_id, get_cities_by_name
+from city import City, get_city_by_id, get_cities_by_name, get_distance_matrix
+from country import Country
 from itinerary import Itinerary
 from vehicles import Vehicle, create_example_vehicles, TeleportingTarteTrolley
 from csv_parsing import create_cities_countries_from_csv
+from travel_tables import get_travel_table
+from hierarchical_routing import get_router
+import stats
 
 # a list of all the city values
 city_nodes = City.id_to_cities.values()
 
+# the maximum number of graphs kept by get_graph
+GRAPH_CACHE_SIZE = 8
+
+# associates vehicle keys to their graph, from the least to the most recently used
+graph_cache = OrderedDict()
+
+# the versions of the city and country registries the cached graphs were built from
+graph_cache_version = None
+
+
+def vehicle_key(vehicle: Vehicle) -> tuple:
+    """
+    Returns a key identifying a vehicle by its type and its parameters
+    (e.g. its speed), so that two identical vehicles share the same key.
+
+    :param vehicle: The vehicle.
+    :return: A hashable key for the vehicle.
+    """
+    return (type(vehicle), tuple(sorted(vars(vehicle).items())))
+
+
+def build_graph(vehicle: Vehicle) -> networkx.Graph:
+    """
+    Builds the graph of all the known cities, where an edge links two cities if the
+    vehicle can travel directly between them, weighted by the travel time.
+
+    :param vehicle: The vehicle to use.
+    :return: The graph of the cities for this vehicle.
+    """
+
+    # networkx can add_node and add_edge
+    # For us, a node would represent a city (for example, Melbourne):
+    # An edge is a link between two nodes
+    # (for example, between the Melbourne and Kuala Lumpur nodes):
+    # In order to represent the fact that there is a travel duration, we add weights on edges:
+
+    with stats.timed("build_graph"):
+        # create a graph
+        graph = networkx.Graph()
+
+        # add all the nodes to the graph
+        cities = list(city_nodes)
+        graph.add_nodes_from(cities)
+
+        # add an edge (weighted by the travel time) for each direct trip the vehicle can make
+        graph.add_weighted_edges_from(vehicle.travel_edges(cities))
+
+    stats.increment("graph_edges", graph.number_of_edges())
+    return graph
+
+
+def get_graph(vehicle: Vehicle) -> networkx.Graph:
+    """
+    Returns the graph of all the known cities for a vehicle, reusing the graph built for an
+    identical vehicle if no city was added since. The GRAPH_CACHE_SIZE most recently used
+    graphs are kept.
+
+    :param vehicle: The vehicle to use.
+    :return: The graph of the cities for this vehicle. It must not be modified.
+    """
+    global graph_cache_version
+
+    # adding cities (or cities to countries) changes the graphs, so all of them are dropped
+    version = (City.registry_version, Country.registry_version)
+    if version != graph_cache_version:
+        graph_cache.clear()
+        graph_cache_version = version
+
+    key = vehicle_key(vehicle)
+    if key in graph_cache:
+        graph_cache.move_to_end(key)
+        return graph_cache[key]
+
+    graph = build_graph(vehicle)
+    graph_cache[key] = graph
+    if len(graph_cache) > GRAPH_CACHE_SIZE:
+        # drop the least recently used graph
+        graph_cache.popitem(last=False)
+
+    return graph
+
+
+def prepare_search(vehicle: Vehicle) -> None:
+    """
+    Builds what find_shortest_path needs for a vehicle: the distance matrix if it can go
+    directly between any two cities, its router if it is hierarchical, its graph otherwise.
+
+    :param vehicle: The vehicle to use.
+    :return: None
+    """
+    if vehicle.complete_graph:
+        get_distance_matrix()
+    elif vehicle.hierarchical:
+        get_router(vehicle)
+    else:
+        get_graph(vehicle)
+
 
 def find_shortest_path(
     vehicle: Vehicle, from_city: City, to_city: City
@@ -22,38 +127,34 @@ def find_shortest_path(
     :param to_city: The arrival city.
     :return: A shortest path from departure to arrival, or None if there is none.
     """
+    # the path from a city to itself has no leg
+    if from_city is to_city:
+        return Itinerary([from_city])
 
-    # networkx can add_node and add_edge
-    # For us, a node would represent a city (for example, Melbourne):
-    # An edge is a link between two nodes
-    # (for example, between the Melbourne and Kuala Lumpur nodes):
-    # In order to represent the fact that there is a travel duration, we add weights on edges:
+    # a table precomputed by load_travel_tables answers without any search
+    table = get_travel_table(vehicle)
+    if table is not None:
+        with stats.timed("travel_table_lookup"):
+            return table.itinerary(from_city, to_city)
 
-    # create a graph
-    graph = networkx.Graph()
-
-    # add all the nodes to the graph
-    graph.add_nodes_from(city_nodes)
-
-    for departure_city in city_nodes:
-        for arrival_city in city_nodes:
-            if departure_city != arrival_city:
-                # check if we have add this edge already or not
-                if graph.has_edge(departure_city, arrival_city):
-                    continue
-                # calculate travel time
-                travel_time = vehicle.compute_travel_time(departure_city, arrival_city)
-                # check if travel time isn't inf before adding an edge between cities
-                if travel_time != math.inf:
-                    #  add edge
-                    graph.add_edge(departure_city, arrival_city, weight=travel_time)
+    if vehicle.complete_graph:
+        with stats.timed("astar_search"):
+            return find_shortest_path_astar(vehicle, from_city, to_city)
+
+    if vehicle.hierarchical:
+        router = get_router(vehicle)
+        with stats.timed("hierarchical_search"):
+            return router.shortest_path(from_city, to_city)
+
+    graph = get_graph(vehicle)
 
     # we try to find the shortest path and return it as well as make sure it isn't None
     # if the try fails, due to no path was found, we return None
     try:
-        shortest_path = networkx.shortest_path(
-            graph, from_city, to_city, weight="weight"
-        )
+        with stats.timed("graph_search"):
+            shortest_path = networkx.shortest_path(
+                graph, from_city, to_city, weight="weight"
+            )
         if vehicle.compute_travel_time(shortest_path[0], shortest_path[1]) == math.inf:
             return None
 
@@ -62,6 +163,150 @@ def find_shortest_path(
         return None
 
 
+def find_shortest_paths(
+    vehicle: Vehicle, sources: Iterable[City], targets: Iterable[City]
+) -> dict[tuple[City, City], Itinerary | None]:
+    """
+    Returns a shortest path for a given vehicle from each of the departure cities
+    to each of the arrival cities.
+    The paths from one departure city are all taken from a single shortest path tree.
+
+    :param vehicle: The vehicle to use.
+    :param sources: The departure cities.
+    :param targets: The arrival cities.
+    :return: A dict associating each (departure, arrival) pair to a shortest path
+             as an Itinerary, or None if there is none.
+    """
+    sources = list(dict.fromkeys(sources))
+    targets = list(dict.fromkeys(targets))
+
+    shortest_paths = dict()
+
+    # a table precomputed by load_travel_tables answers without any search
+    table = get_travel_table(vehicle)
+    if table is not None:
+        with stats.timed("travel_table_lookup"):
+            for from_city in sources:
+                for to_city in targets:
+                    shortest_paths[(from_city, to_city)] = table.itinerary(from_city, to_city)
+        return shortest_paths
+
+    # the graph of such a vehicle is too big to be built, each path is found on its own
+    if vehicle.complete_graph:
+        for from_city in sources:
+            for to_city in targets:
+                shortest_paths[(from_city, to_city)] = find_shortest_path_astar(
+                    vehicle, from_city, to_city
+                )
+        return shortest_paths
+
+    # a query of such a vehicle only looks at the cities of two countries
+    if vehicle.hierarchical:
+        router = get_router(vehicle)
+        for from_city in sources:
+            for to_city in targets:
+                shortest_paths[(from_city, to_city)] = router.shortest_path(from_city, to_city)
+        return shortest_paths
+
+    graph = get_graph(vehicle)
+    for from_city in sources:
+        # paths from the departure city to every city it can reach
+        with stats.timed("graph_search"):
+            paths = networkx.single_source_dijkstra_path(graph, from_city, weight="weight")
+        for to_city in targets:
+            if to_city in paths:
+                shortest_paths[(from_city, to_city)] = Itinerary(paths[to_city])
+            else:
+                shortest_paths[(from_city, to_city)] = None
+
+    return shortest_paths
+
+
+def find_reachable_cities(vehicle: Vehicle, from_city: City) -> list[City]:
+    """
+    Returns the cities that can be reached from a city with a given vehicle,
+    directly or not, including the city itself.
+
+    :param vehicle: The vehicle to use.
+    :param from_city: The departure city.
+    :return: The reachable cities, in no particular order.
+    """
+    # such a vehicle can go directly from any city to any other
+    if vehicle.complete_graph:
+        return list(city_nodes)
+
+    if vehicle.hierarchical:
+        return get_router(vehicle).reachable_cities(from_city)
+
+    return list(networkx.node_connected_component(get_graph(vehicle), from_city))
+
+
+def find_shortest_path_astar(
+    vehicle: Vehicle, from_city: City, to_city: City
+) -> Itinerary | None:
+    """
+    Returns a shortest path between two cities for a given vehicle as an Itinerary,
+    or None if there is no path, without building the graph of all the cities.
+    The neighbours of a city are computed when it is reached, and the cities closest to
+    the arrival (according to vehicle.travel_time_lower_bound) are explored first.
+
+    :param vehicle: The vehicle to use.
+    :param from_city: The departure city.
+    :param to_city: The arrival city.
+    :return: A shortest path from departure to arrival, or None if there is none.
+    """
+    # each entry of the heap is (travel time so far + lower bound to the arrival,
+    # lower bound to the arrival, insertion order, travel time so far, city).
+    # On ties, the city closest to the arrival is explored first, so the arrival
+    # itself is taken as soon as its travel time is known to be the shortest
+    order = itertools.count()
+    lower_bound = vehicle.travel_time_lower_bound(from_city, to_city)
+    heap = [(lower_bound, lower_bound, next(order), 0, from_city)]
+
+    travel_times = {from_city: 0}
+    previous_cities = {from_city: None}
+    explored = set()
+
+    while heap:
+        _, _, _, travel_time, city = heapq.heappop(heap)
+        if city in explored:
+            continue
+
+        if city is to_city:
+            shortest_path = []
+            while city is not None:
+                shortest_path.append(city)
+                city = previous_cities[city]
+            shortest_path.reverse()
+            return Itinerary(shortest_path)
+
+        explored.add(city)
+        for neighbour in city_nodes:
+            if neighbour in explored:
+                continue
+            leg_time = vehicle.compute_travel_time(city, neighbour)
+            if leg_time == math.inf:
+                continue
+
+            new_travel_time = travel_time + leg_time
+            if new_travel_time < travel_times.get(neighbour, math.inf):
+                travel_times[neighbour] = new_travel_time
+                previous_cities[neighbour] = city
+                lower_bound = vehicle.travel_time_lower_bound(neighbour, to_city)
+                heapq.heappush(
+                    heap,
+                    (
+                        new_travel_time + lower_bound,
+                        lower_bound,
+                        next(order),
+                        new_travel_time,
+                        neighbour,
+                    ),
+                )
+
+    return None
+
+
 if __name__ == "__main__":
     create_cities_countries_from_csv("worldcities_truncated.csv")
 
@@ -81,13 +326,19 @@ if __name__ == "__main__":
     # print(f"\t{test_vehicle.compute_itinerary_time(shortest_path)}"
     #         f" hours with {test_vehicle} with path {shortest_path}.")
 
+    # all the shortest paths of a vehicle are found at once
+    shortest_paths = {
+        test_vehicle: find_shortest_paths(test_vehicle, from_cities, from_cities)
+        for test_vehicle in vehicles
+    }
+
     to_cities = set(from_cities)
     for from_city in from_cities:
         to_cities -= {from_city}
         for to_city in to_cities:
             print(f"{from_city} to {to_city}:")
             for test_vehicle in vehicles:
-                shortest_path = find_shortest_path(test_vehicle, from_city, to_city)
+                shortest_path = shortest_paths[test_vehicle][(from_city, to_city)]
                 print(
                     f"\t{test_vehicle.compute_itinerary_time(shortest_path)}"
                     f" hours with {test_vehicle} with path {shortest_path}."
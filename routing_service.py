@@ -0,0 +1,343 @@
+import argparse
+import asyncio
+import gc
+import json
+import math
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+from city import get_city_by_id, get_distance_matrix
+from itinerary import Itinerary
+from csv_parsing import create_cities_countries_from_csv
+from path_finding import find_reachable_cities, prepare_search
+from vehicles import create_example_vehicles
+from batch_routing import get_vehicle, load_worker_data, route_query
+import stats
+
+# the path of the Unix socket the service listens to by default
+SOCKET_PATH = "routing_service.sock"
+
+# number of most recent latencies of each operation kept for the statistics
+LATENCY_WINDOW = 10000
+
+# the largest request accepted, in bytes
+MAX_REQUEST_SIZE = 1 << 20
+
+
+def reachable_query(query: dict) -> dict:
+    """
+    Finds the cities that can be reached from a city, for a query of the form
+    {"vehicle": {"type": ..., ...}, "from": city ID}. Runs in the workers.
+
+    :param query: the query.
+    :return: the IDs of the reachable cities, or an error message.
+    """
+    vehicle = get_vehicle(query["vehicle"])
+    from_city = get_city_by_id(query["from"])
+    if from_city is None:
+        raise ValueError("unknown city ID")
+
+    return {"cities": sorted(city.city_id for city in find_reachable_cities(vehicle, from_city))}
+
+
+def itinerary_time_query(query: dict) -> dict:
+    """
+    Computes the travel time of an itinerary, for a query of the form
+    {"vehicle": {"type": ..., ...}, "cities": [city ID, ...]}. Runs in the workers.
+
+    :param query: the query.
+    :return: the travel time in hours (None if the travel is not possible).
+    """
+    vehicle = get_vehicle(query["vehicle"])
+    cities = [get_city_by_id(city_id) for city_id in query["cities"]]
+    if None in cities:
+        raise ValueError("unknown city ID")
+
+    hours = vehicle.compute_itinerary_time(Itinerary(cities))
+    return {"hours": None if hours == math.inf else hours}
+
+
+class RoutingService:
+    """
+    Answers routing requests sent as JSON lines, e.g.
+    {"id": 1, "op": "shortest_path", "vehicle": {"type": "CrappyCrepeCar", "speed": 200},
+     "from": 1036533631, "to": 1036142029}
+    The operations are shortest_path, itinerary_time, reachable and stats.
+    Each answer is a JSON line with the id of its request. Answers can come in any order.
+    """
+
+    def __init__(self, executor: ProcessPoolExecutor) -> None:
+        """
+        Creates a service running the searches in the given pool of processes.
+
+        :param executor: the pool of processes.
+        :return: None
+        """
+        self.executor = executor
+        self.started = time.perf_counter()
+        # associates each operation to its most recent latencies in seconds
+        self.latencies = dict()
+
+    def statistics(self) -> dict:
+        """
+        Returns the number of requests and the latency percentiles (in milliseconds)
+        of each operation.
+
+        :return: the statistics.
+        """
+        operations = dict()
+        for operation, latencies in self.latencies.items():
+            milliseconds = np.array(latencies) * 1000
+            operations[operation] = {
+                "count": len(latencies),
+                "p50_ms": float(np.percentile(milliseconds, 50)),
+                "p99_ms": float(np.percentile(milliseconds, 99)),
+            }
+        statistics = {
+            "uptime_s": time.perf_counter() - self.started,
+            "operations": operations,
+        }
+        if stats.enabled:
+            # the hot paths of the service and of its workers (see stats.py)
+            statistics["hot_paths"] = stats.get_stats()
+        return statistics
+
+    async def run_in_worker(self, query_function, request: dict) -> dict:
+        """
+        Answers a request in the pool of processes, keeping the statistics of the worker.
+
+        :param query_function: the function answering the request.
+        :param request: the request.
+        :return: the answer.
+        """
+        answer, statistics = await asyncio.get_running_loop().run_in_executor(
+            self.executor, stats.call_collecting, query_function, request
+        )
+        stats.merge(statistics)
+        return answer
+
+    async def answer(self, request: dict) -> dict:
+        """
+        Answers a request, running the searches in the pool of processes.
+
+        :param request: the request.
+        :return: the answer.
+        """
+        operation = request.get("op")
+
+        if operation == "shortest_path":
+            answer = await self.run_in_worker(route_query, request)
+            answer = {key: answer[key] for key in ("hours", "path", "error") if key in answer}
+        elif operation == "reachable":
+            answer = await self.run_in_worker(reachable_query, request)
+        elif operation == "itinerary_time":
+            # a long itinerary must not keep the other requests waiting
+            answer = await self.run_in_worker(itinerary_time_query, request)
+        elif operation == "stats":
+            answer = self.statistics()
+        else:
+            raise ValueError("unknown operation " + str(operation))
+
+        return answer
+
+    async def handle_line(self, line: bytes, writer: asyncio.StreamWriter) -> None:
+        """
+        Answers one request line and writes the answer.
+
+        :param line: the request, as a JSON line.
+        :param writer: the connection of the client.
+        :return: None
+        """
+        start = time.perf_counter()
+        request = dict()
+        try:
+            request = json.loads(line)
+            answer = await self.answer(request)
+        except Exception as error:
+            # every request gets an answer, so that the client never waits forever
+            # (e.g. when a worker of the pool died)
+            answer = {"error": f"{type(error).__name__}: {error}"}
+
+        if isinstance(request, dict):
+            answer["id"] = request.get("id")
+            operation = request.get("op")
+            if operation in ("shortest_path", "itinerary_time", "reachable", "stats"):
+                self.latencies.setdefault(operation, deque(maxlen=LATENCY_WINDOW)).append(
+                    time.perf_counter() - start
+                )
+
+        writer.write(json.dumps(answer).encode() + b"\n")
+        await writer.drain()
+
+    async def handle_client(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        """
+        Answers the requests of a client concurrently, until it disconnects.
+
+        :param reader: the requests of the client.
+        :param writer: the connection of the client.
+        :return: None
+        """
+        tasks = set()
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.handle_line(line, writer))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except (ConnectionError, ValueError):
+            # the client disconnected, or sent a line longer than MAX_REQUEST_SIZE
+            pass
+        finally:
+            writer.close()
+
+
+def prepare_service() -> None:
+    """
+    Builds the routing data once, before the workers are forked: the distance matrix
+    and the graphs or routers of the example vehicles.
+
+    :return: None
+    """
+    get_distance_matrix()
+    for vehicle in create_example_vehicles():
+        prepare_search(vehicle)
+
+
+async def serve(
+    socket_path: str,
+    workers: int,
+    host: str = None,
+    port: int = None,
+    path_to_csv: str = "worldcities_truncated.csv",
+) -> None:
+    """
+    Runs the service until it is interrupted.
+    The known cities are shared with the workers when they are forked as the service starts,
+    the workers load them from the CSV file otherwise.
+
+    :param socket_path: the path of the Unix socket to listen to.
+    :param workers: the number of processes running the searches.
+    :param host: the host to listen to instead of a Unix socket, with the port.
+    :param port: the TCP port to listen to instead of a Unix socket.
+    :param path_to_csv: the path to the CSV file the cities were read from.
+    :return: None
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        # keeps the memory pages of the shared data shared (see batch_routing.run_batch)
+        gc.freeze()
+    else:
+        context = multiprocessing.get_context()
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=load_worker_data,
+            initargs=(path_to_csv,),
+        ) as executor:
+            # the workers are started now, while the service is not answering yet
+            executor.submit(time.sleep, 0).result()
+
+            service = RoutingService(executor)
+            if port is not None:
+                server = await asyncio.start_server(
+                    service.handle_client, host, port, limit=MAX_REQUEST_SIZE
+                )
+                address = f"{host}:{port}"
+            else:
+                if os.path.exists(socket_path):
+                    os.remove(socket_path)
+                server = await asyncio.start_unix_server(
+                    service.handle_client, socket_path, limit=MAX_REQUEST_SIZE
+                )
+                address = socket_path
+
+            # the service stops on Ctrl+C or when it is terminated
+            stopped = asyncio.Event()
+            for signal_number in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    asyncio.get_running_loop().add_signal_handler(signal_number, stopped.set)
+                except NotImplementedError:
+                    pass
+
+            print(f"Routing service listening on {address} with {workers} workers", flush=True)
+            try:
+                async with server:
+                    await stopped.wait()
+            finally:
+                if port is None and os.path.exists(socket_path):
+                    os.remove(socket_path)
+    finally:
+        # the workers are gone, the objects can be collected again
+        gc.unfreeze()
+
+
+def request_service(requests: list[dict], socket_path: str = SOCKET_PATH) -> list[dict]:
+    """
+    Sends requests to a running service and waits for all the answers.
+
+    :param requests: the requests (see RoutingService).
+    :param socket_path: the path of the Unix socket of the service.
+    :return: the answers, in the order of the requests.
+    """
+    requests = [dict(request, id=index) for index, request in enumerate(requests)]
+    answers = [None] * len(requests)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(socket_path)
+        connection.sendall(b"".join(json.dumps(request).encode() + b"\n" for request in requests))
+        with connection.makefile("rb") as lines:
+            for _ in requests:
+                answer = json.loads(lines.readline())
+                answers[answer.pop("id")] = answer
+
+    return answers
+
+
+def run_service(options: argparse.Namespace) -> None:
+    """
+    Loads the cities and runs the service given on the command line (see main).
+
+    :param options: the parsed command line arguments.
+    :return: None
+    """
+    create_cities_countries_from_csv(options.csv)
+    prepare_service()
+
+    asyncio.run(
+        serve(options.socket, options.workers, options.host, options.port, options.csv)
+    )
+
+
+def main(arguments: list[str] = None) -> None:
+    """
+    Loads the cities and runs the service.
+
+    :param arguments: the command line arguments, sys.argv by default.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Answers routing requests sent as JSON lines.")
+    parser.add_argument("--socket", default=SOCKET_PATH, help="the path of the Unix socket")
+    parser.add_argument("--host", default="127.0.0.1", help="the host, with --port")
+    parser.add_argument("--port", type=int, help="listen to a TCP port instead of a Unix socket")
+    parser.add_argument("--csv", default="worldcities_truncated.csv", help="the CSV file of cities")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="the number of processes")
+    stats.add_arguments(parser)
+    options = parser.parse_args(arguments)
+    stats.run(options, run_service, options)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+import json
+import struct
+import time
+import numpy as np
+
+from city import City, get_distance_matrix
+from country import Country
+from distance_matrix import DistanceMatrix
+
+# the first bytes of every snapshot file
+MAGIC = b"VTSNAP01"
+
+# the arrays are stored at offsets that are a multiple of this, so that they can be memory-mapped
+ALIGNMENT = 64
+
+# the entries of the header of every snapshot file
+HEADER_KEYS = ["source_digest", "names", "city_types", "countries", "country_names", "arrays"]
+
+# the arrays of every snapshot file, besides the optional distance matrix
+ARRAY_NAMES = [
+    "latitudes",
+    "longitudes",
+    "populations",
+    "city_ids",
+    "country_cities",
+    "country_sizes",
+]
+
+
+def save_snapshot(path: str, source_digest: str = "") -> None:
+    """
+    Saves the known cities and countries (and the distance matrix if it is up to date)
+    into a binary file.
+    The file starts with MAGIC, then the length of a JSON header (4 bytes, little-endian),
+    the JSON header describing the strings and the arrays, then the raw arrays.
+
+    :param path: The path of the snapshot file.
+    :param source_digest: The digest of the CSV file the registries were read from (see csv_digest).
+    :return: None
+    """
+    cities = list(City.id_to_cities.values())
+    index_of = {city: index for index, city in enumerate(cities)}
+
+    # the cities of each country are stored one country after the other, in countries_and_their_cities order
+    country_names = list(Country.countries_and_their_cities.keys())
+    country_cities = [
+        index_of[city]
+        for name in country_names
+        for city in Country.countries_and_their_cities[name]
+    ]
+    country_sizes = [len(Country.countries_and_their_cities[name]) for name in country_names]
+
+    arrays = {
+        "latitudes": np.array([city.coordinates[0] for city in cities], dtype="<f8"),
+        "longitudes": np.array([city.coordinates[1] for city in cities], dtype="<f8"),
+        "populations": np.array([city.population for city in cities], dtype="<i8"),
+        "city_ids": np.array([city.city_id for city in cities], dtype="<i8"),
+        "country_cities": np.array(country_cities, dtype="<i4"),
+        "country_sizes": np.array(country_sizes, dtype="<i4"),
+    }
+
+    matrix = City.distance_matrix
+    if matrix is not None and matrix.version == City.registry_version:
+        arrays["distances"] = matrix.distances.astype("<i4")
+
+    header = {
+        "source_digest": source_digest,
+        "names": [city.name for city in cities],
+        "city_types": [city.city_type for city in cities],
+        "countries": [
+            [country.name, country.iso3] for country in Country.name_to_countries.values()
+        ],
+        "country_names": country_names,
+        "arrays": dict(),
+    }
+
+    # the offsets are relative to the end of the header
+    offset = 0
+    for name, values in arrays.items():
+        header["arrays"][name] = {
+            "dtype": values.dtype.str,
+            "shape": values.shape,
+            "offset": offset,
+        }
+        offset += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+
+    encoded_header = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 4 + len(encoded_header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path, "wb") as file:
+        file.write(MAGIC)
+        file.write(struct.pack("<I", len(encoded_header)))
+        file.write(encoded_header)
+        for name, values in arrays.items():
+            file.seek(data_start + header["arrays"][name]["offset"])
+            file.write(values.tobytes())
+
+
+def read_snapshot_header(path: str) -> tuple[dict, int]:
+    """
+    Reads the JSON header of a snapshot file.
+    Raises ValueError if the file is not a snapshot file of this version, or is truncated.
+
+    :param path: The path of the snapshot file.
+    :return: The header, and the position in the file where the arrays start.
+    """
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(path + " is not a snapshot file")
+        try:
+            (header_length,) = struct.unpack("<I", file.read(4))
+        except struct.error:
+            raise ValueError(path + " is truncated") from None
+        encoded_header = file.read(header_length)
+        if len(encoded_header) != header_length:
+            raise ValueError(path + " is truncated")
+        header = json.loads(encoded_header)
+
+    if not isinstance(header, dict) or any(key not in header for key in HEADER_KEYS):
+        raise ValueError(path + " has an invalid header")
+
+    data_start = -(-(len(MAGIC) + 4 + header_length) // ALIGNMENT) * ALIGNMENT
+    return header, data_start
+
+
+def snapshot_digest(path: str) -> str:
+    """
+    Returns the digest of the CSV file a snapshot was saved from.
+
+    :param path: The path of the snapshot file.
+    :return: The digest given to save_snapshot.
+    """
+    return read_snapshot_header(path)[0]["source_digest"]
+
+
+def load_snapshot(path: str) -> None:
+    """
+    Creates the cities and countries saved in a snapshot file, in the same order as
+    they were created when the snapshot was saved.
+    The arrays are memory-mapped, and the distance matrix is reused if it was saved.
+    Raises ValueError if the file is not a valid snapshot file, before creating any city.
+
+    :param path: The path of the snapshot file.
+    :return: None
+    """
+    header, data_start = read_snapshot_header(path)
+    if any(name not in header["arrays"] for name in ARRAY_NAMES):
+        raise ValueError(path + " has missing arrays")
+
+    arrays = dict()
+    for name, description in header["arrays"].items():
+        try:
+            arrays[name] = np.memmap(
+                path,
+                dtype=np.dtype(description["dtype"]),
+                mode="r",
+                offset=data_start + description["offset"],
+                shape=tuple(description["shape"]),
+            )
+        except (KeyError, TypeError) as error:
+            raise ValueError(f"{path} has an invalid description of {name}: {error}") from None
+
+    city_count = len(header["names"])
+    if len(header["city_types"]) != city_count or any(
+        len(arrays[name]) != city_count
+        for name in ["latitudes", "longitudes", "populations", "city_ids"]
+    ):
+        raise ValueError(path + " has columns of different lengths")
+    saved_countries = {country_name for country_name, _ in header["countries"]}
+    if (
+        len(header["country_names"]) != len(arrays["country_sizes"])
+        or len(arrays["country_cities"]) != sum(arrays["country_sizes"].tolist())
+        or not saved_countries.issuperset(header["country_names"])
+        or any(not 0 <= index < city_count for index in arrays["country_cities"].tolist())
+    ):
+        raise ValueError(path + " has invalid countries")
+
+    cities = [
+        City(name, (latitude, longitude), city_type, population, city_id)
+        for name, latitude, longitude, city_type, population, city_id in zip(
+            header["names"],
+            arrays["latitudes"].tolist(),
+            arrays["longitudes"].tolist(),
+            header["city_types"],
+            arrays["populations"].tolist(),
+            arrays["city_ids"].tolist(),
+        )
+    ]
+
+    for country_name, country_iso3 in header["countries"]:
+        if country_name not in Country.name_to_countries:
+            Country(country_name, country_iso3)
+
+    country_cities = iter(arrays["country_cities"].tolist())
+    for country_name, size in zip(header["country_names"], arrays["country_sizes"].tolist()):
+        country = Country.name_to_countries[country_name]
+        for _ in range(size):
+            country.add_city(cities[next(country_cities)])
+
+    # the saved matrix is only valid if no other city was known before loading
+    if "distances" in arrays and len(City.id_to_cities) == len(cities):
+        City.distance_matrix = DistanceMatrix(
+            cities, City.registry_version, arrays["distances"]
+        )
+
+
+if __name__ == "__main__":
+    from csv_parsing import (
+        create_cities_countries_from_csv,
+        csv_digest,
+        SNAPSHOT_SUFFIX,
+    )
+
+    # the distance matrix is saved along with the cities
+    create_cities_countries_from_csv("worldcities_truncated.csv")
+    get_distance_matrix()
+
+    snapshot_path = "worldcities_truncated.csv" + SNAPSHOT_SUFFIX
+    start = time.perf_counter()
+    save_snapshot(snapshot_path, csv_digest("worldcities_truncated.csv"))
+    print(
+        f"Saved {len(City.id_to_cities)} cities to {snapshot_path}"
+        f" in {(time.perf_counter() - start) * 1000:.1f} ms"
+    )
@@ -0,0 +1,124 @@
+from __future__ import annotations  # https://peps.python.org/pep-0563/
+from typing import Iterable, TYPE_CHECKING
+import math
+import numpy as np
+from geopy.distance import EARTH_RADIUS
+from distance_matrix import ceil_great_circle_km
+
+if TYPE_CHECKING:
+    from city import City
+
+# extra distance (in km) added to the radius when collecting candidates,
+# so that rounding errors never leave out a city that is within the radius
+RADIUS_MARGIN = 1
+
+# the smallest size of the cells in km: smaller cells would only make queries visit more
+# empty cells, since the radius of every query is extended by RADIUS_MARGIN anyway
+MIN_CELL_SIZE_KM = 10
+
+
+def chord_length(distance_km: float) -> float:
+    """
+    Returns the length of the straight line between two points of the unit sphere
+    that are a given great circle distance apart on Earth.
+
+    :param distance_km: the great circle distance in kilometers.
+    :return: the length of the chord on the unit sphere.
+    """
+    angle = min(distance_km / EARTH_RADIUS, math.pi)
+    return 2 * math.sin(angle / 2)
+
+
+class SpatialIndex:
+    """
+    Buckets cities into a grid of cubes according to their position on the unit sphere,
+    to find the cities within a given distance of a city without looking at all the others.
+    """
+
+    def __init__(self, cities: Iterable[City], cell_size_km: float) -> None:
+        """
+        Creates the index of the given cities.
+        Queries are the fastest for a radius close to the size of the cells.
+
+        :param cities: the cities to index.
+        :param cell_size_km: the size of the cells of the grid, as a great circle distance in km.
+        :return: None
+        """
+        self.cities = list(cities)
+        self.id_to_index = {city.city_id: index for index, city in enumerate(self.cities)}
+        self.latitudes = np.array([city.coordinates[0] for city in self.cities], dtype=float)
+        self.longitudes = np.array([city.coordinates[1] for city in self.cities], dtype=float)
+
+        latitudes, longitudes = np.radians(self.latitudes), np.radians(self.longitudes)
+        self.points = np.column_stack(
+            (
+                np.cos(latitudes) * np.cos(longitudes),
+                np.cos(latitudes) * np.sin(longitudes),
+                np.sin(latitudes),
+            )
+        )
+
+        self.cell_size = chord_length(max(cell_size_km, MIN_CELL_SIZE_KM))
+        self.cell_of_city = np.floor(self.points / self.cell_size).astype(np.int64).tolist()
+
+        # associates the coordinates of a cell to the indexes of its cities, in increasing order
+        cells = dict()
+        for index, cell in enumerate(map(tuple, self.cell_of_city)):
+            cells.setdefault(cell, []).append(index)
+        self.cells = {
+            cell: np.array(indexes, dtype=np.int64) for cell, indexes in cells.items()
+        }
+
+    def indexes_within(self, index: int, radius_km: float) -> np.ndarray:
+        """
+        Returns the indexes of the cities whose distance (in km, rounded up like City.distance)
+        to the city at the given index is at most the radius, in increasing order.
+        The city itself is included.
+
+        :param index: the index of the city, in the order the cities were given.
+        :param radius_km: the maximum distance in kilometers.
+        :return: the indexes of the cities within the radius.
+        """
+        # every city within the radius is inside the cube around the city's point
+        # whose half side is the chord of the radius
+        if radius_km < 0:
+            return np.zeros(0, dtype=np.int64)
+
+        reach = math.ceil(chord_length(radius_km + RADIUS_MARGIN) / self.cell_size)
+        x, y, z = self.cell_of_city[index]
+
+        if (2 * reach + 1) ** 3 > len(self.cells):
+            # the cube holds more cells than the grid has non-empty cells, all the cities are looked at
+            candidates = np.arange(len(self.cities), dtype=np.int64)
+        else:
+            candidates = []
+            for cell_x in range(x - reach, x + reach + 1):
+                for cell_y in range(y - reach, y + reach + 1):
+                    for cell_z in range(z - reach, z + reach + 1):
+                        cell = self.cells.get((cell_x, cell_y, cell_z))
+                        if cell is not None:
+                            candidates.append(cell)
+            if not candidates:
+                return np.zeros(0, dtype=np.int64)
+            candidates = np.sort(np.concatenate(candidates))
+
+        distances = ceil_great_circle_km(
+            self.latitudes[index],
+            self.longitudes[index],
+            self.latitudes[candidates],
+            self.longitudes[candidates],
+        )
+
+        return candidates[distances <= radius_km]
+
+    def cities_within(self, city: City, radius_km: float) -> list[City]:
+        """
+        Returns the indexed cities whose distance to the given city is at most the radius.
+        The city itself is included if it is indexed.
+
+        :param city: the city at the center, which must be indexed.
+        :param radius_km: the maximum distance in kilometers.
+        :return: the cities within the radius, in the order they were given.
+        """
+        index = self.id_to_index[city.city_id]
+        return [self.cities[other] for other in self.indexes_within(index, radius_km)]
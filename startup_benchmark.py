@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import REGRESSION_TOLERANCE, compare_with_baseline
+
+# the first prompt of onboard_navigation.py
+FIRST_PROMPT = b"Choose a vehicle"
+
+# the median time in seconds to the first prompt above which the benchmark fails by default
+MAX_TIME_TO_FIRST_PROMPT = 1.5
+
+# the measures of a previous run, to compare the startup to
+STARTUP_BASELINE = "startup_baseline.json"
+
+# modules that must not be imported before the first prompt, since they are slow to import
+LAZY_MODULES = ["networkx", "matplotlib", "mpl_toolkits.basemap", "path_finding", "map_plotting"]
+
+
+def parse_import_times(output: str) -> dict[str, int]:
+    """
+    Reads the output of python -X importtime.
+
+    :param output: the standard error of the Python process.
+    :return: associates each imported module to its cumulative import time in microseconds.
+    """
+    import_times = dict()
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line[len("import time:") :].split("|")
+        if cumulative.strip().isdigit():
+            import_times[module.strip()] = int(cumulative)
+    return import_times
+
+
+def measure_import_times(module: str) -> dict[str, int]:
+    """
+    Imports a module in a new Python process with python -X importtime.
+
+    :param module: the module to import.
+    :return: associates each module imported along with it to its cumulative import time
+             in microseconds.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        capture_output=True,
+        text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr)
+    return parse_import_times(process.stderr)
+
+
+def measure_time_to_first_prompt(script: str) -> float:
+    """
+    Runs a script in a new Python process until it shows its first prompt.
+
+    :param script: the path of the script.
+    :return: the time in seconds between the start of the process and the first prompt.
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, script],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    output = b""
+    try:
+        while FIRST_PROMPT not in output:
+            character = process.stdout.read(1)
+            if not character:
+                raise RuntimeError(script + " stopped before its first prompt")
+            output += character
+        return time.perf_counter() - start
+    finally:
+        process.kill()
+        process.wait()
+
+
+def main(arguments: list[str] = None) -> None:
+    """
+    Measures the startup of onboard_navigation.py, and exits with an error if the time
+    to the first prompt is above a threshold, if a slow module is imported at startup,
+    or if the startup is slower than in the baseline (see benchmarks.compare_with_baseline).
+
+    :param arguments: the command line arguments, sys.argv by default.
+    :return: None
+    """
+    parser = argparse.ArgumentParser(description="Measures the startup of onboard_navigation.py.")
+    parser.add_argument("--runs", type=int, default=5, help="the number of measures")
+    parser.add_argument(
+        "--max-seconds",
+        type=float,
+        default=MAX_TIME_TO_FIRST_PROMPT,
+        help="the maximum median time to the first prompt",
+    )
+    parser.add_argument("--top", type=int, default=10, help="the number of slowest imports shown")
+    parser.add_argument(
+        "--baseline", default=STARTUP_BASELINE, help="the measures to compare the startup to"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="save the measures as the baseline instead of comparing them to it",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=REGRESSION_TOLERANCE,
+        help="the fraction by which a measure can be slower than the baseline",
+    )
+    options = parser.parse_args(arguments)
+
+    # the script reads its CSV file from its own directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    import_times = measure_import_times("onboard_navigation")
+    print("Slowest imports of onboard_navigation (cumulative):")
+    for module, microseconds in sorted(import_times.items(), key=lambda item: -item[1])[
+        : options.top
+    ]:
+        print(f"\t{microseconds / 1000:8.1f} ms  {module}")
+
+    failures = [
+        f"{module} is imported at startup" for module in LAZY_MODULES if module in import_times
+    ]
+
+    times = [measure_time_to_first_prompt("onboard_navigation.py") for _ in range(options.runs)]
+    median = statistics.median(times)
+    print(
+        f"Time to first prompt: median {median:.3f} s, min {min(times):.3f} s,"
+        f" max {max(times):.3f} s over {options.runs} runs"
+    )
+    if median > options.max_seconds:
+        failures.append(
+            f"the time to first prompt ({median:.3f} s) is above {options.max_seconds} s"
+        )
+
+    results = {
+        "import_onboard_navigation_s": import_times["onboard_navigation"] / 1e6,
+        "time_to_first_prompt_s": median,
+    }
+    if options.save_baseline:
+        with open(options.baseline, "w") as file:
+            json.dump({"results": results}, file, indent=2)
+        print(f"Baseline saved to {options.baseline}")
+    elif not os.path.exists(options.baseline):
+        print(f"No baseline to compare to ({options.baseline}), use --save-baseline to make one")
+    else:
+        with open(options.baseline) as file:
+            baseline = json.load(file)["results"]
+        failures += compare_with_baseline(results, baseline, options.tolerance)
+
+    for failure in failures:
+        print("FAILED: " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+import argparse
+import functools
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable
+
+# whether the hot paths are counted and timed (see enable)
+enabled = False
+
+# associates the name of each counter to its value
+counters = Counter()
+
+# associates the name of each timer to [number of measures, total time in seconds]
+timers = dict()
+
+# the (class, attribute, original function) of the methods wrapped by enable
+wrapped_methods = []
+
+# the number of lines of the profiling report shown for each sort order
+PROFILE_LINES = 40
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """
+    Adds to a counter, if the statistics are enabled.
+
+    :param name: the name of the counter.
+    :param amount: the amount added.
+    :return: None
+    """
+    if enabled:
+        counters[name] += amount
+
+
+def add_time(name: str, seconds: float, count: int = 1) -> None:
+    """
+    Adds measures to a timer, if the statistics are enabled.
+
+    :param name: the name of the timer.
+    :param seconds: the time measured.
+    :param count: the number of measures.
+    :return: None
+    """
+    if enabled:
+        timer = timers.setdefault(name, [0, 0.0])
+        timer[0] += count
+        timer[1] += seconds
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Measures the time spent in a with block, if the statistics are enabled.
+
+    :param name: the name of the timer.
+    """
+    if not enabled:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_time(name, time.perf_counter() - start)
+
+
+def counted(function: Callable, name: str | None) -> Callable:
+    """
+    Returns a method counting its calls, under a fixed name or under the name
+    of the class of the instance it is called on.
+
+    :param function: the original method.
+    :param name: the name of the counter, or None to count the calls under the name of the
+                 method followed by the name of the class of the instance.
+    :return: the method counting its calls.
+    """
+    method_name = function.__name__
+
+    @functools.wraps(function)
+    def wrapper(self, *args, **kwargs):
+        counters[name or f"{method_name}.{type(self).__name__}"] += 1
+        return function(self, *args, **kwargs)
+
+    return wrapper
+
+
+def all_subclasses(cls: type) -> list[type]:
+    """
+    Returns the subclasses of a class, direct or not.
+
+    :param cls: the class.
+    :return: the subclasses.
+    """
+    subclasses = []
+    for subclass in cls.__subclasses__():
+        subclasses.append(subclass)
+        subclasses.extend(all_subclasses(subclass))
+    return subclasses
+
+
+def enable() -> None:
+    """
+    Starts counting and timing the hot paths:
+    the calls of City.distance, the calls of compute_travel_time of each vehicle class,
+    the time to build graphs and their number of edges, the time spent searching paths
+    and the number of CSV rows parsed.
+    The methods called most often are only wrapped while the statistics are enabled,
+    so that they cost nothing otherwise.
+    The statistics are kept per process.
+
+    :return: None
+    """
+    global enabled
+    if enabled:
+        return
+
+    from city import City
+    from vehicles import Vehicle
+
+    methods = [(City, "distance", "City.distance")]
+    for vehicle_class in all_subclasses(Vehicle):
+        if "compute_travel_time" in vars(vehicle_class):
+            methods.append((vehicle_class, "compute_travel_time", None))
+
+    for cls, attribute, name in methods:
+        original = vars(cls)[attribute]
+        wrapped_methods.append((cls, attribute, original))
+        setattr(cls, attribute, counted(original, name))
+
+    enabled = True
+
+
+def disable() -> None:
+    """
+    Stops counting and timing the hot paths, and restores the wrapped methods.
+    The statistics are kept until reset.
+
+    :return: None
+    """
+    global enabled
+    while wrapped_methods:
+        cls, attribute, original = wrapped_methods.pop()
+        setattr(cls, attribute, original)
+    enabled = False
+
+
+def reset() -> None:
+    """
+    Sets all the counters and timers back to zero.
+
+    :return: None
+    """
+    counters.clear()
+    timers.clear()
+
+
+def get_stats() -> dict:
+    """
+    Returns the current statistics.
+
+    :return: {"counters": {name: value}, "timers": {name: {"count": ..., "total_s": ...}}}
+    """
+    return {
+        "counters": dict(counters),
+        "timers": {
+            name: {"count": count, "total_s": seconds}
+            for name, (count, seconds) in timers.items()
+        },
+    }
+
+
+def merge(statistics: dict | None) -> None:
+    """
+    Adds statistics collected elsewhere (e.g. in another process) to the current ones.
+
+    :param statistics: statistics returned by get_stats, or None.
+    :return: None
+    """
+    if statistics is None:
+        return
+    counters.update(statistics["counters"])
+    for name, timer in statistics["timers"].items():
+        add_time(name, timer["total_s"], timer["count"])
+
+
+def call_collecting(function: Callable, *args) -> tuple:
+    """
+    Calls a function and collects the statistics of the call, so that a worker process
+    can send them back along with the result. Does nothing more than calling the function
+    if the statistics are not enabled.
+
+    :param function: the function.
+    :param args: the arguments of the function.
+    :return: the result of the function, and the statistics of the call (or None).
+    """
+    if not enabled:
+        return function(*args), None
+
+    reset()
+    result = function(*args)
+    statistics = get_stats()
+    reset()
+    return result, statistics
+
+
+def format_stats(statistics: dict = None) -> str:
+    """
+    Returns a readable report of statistics.
+
+    :param statistics: statistics returned by get_stats, the current ones by default.
+    :return: the report.
+    """
+    if statistics is None:
+        statistics = get_stats()
+
+    lines = ["Counters:"]
+    for name, value in sorted(statistics["counters"].items()):
+        lines.append(f"\t{name:<48} {value:>12}")
+    lines.append("Timers:")
+    for name, timer in sorted(statistics["timers"].items()):
+        count, seconds = timer["count"], timer["total_s"]
+        lines.append(
+            f"\t{name:<48} {count:>12} in {seconds:10.3f} s"
+            f" ({seconds / max(count, 1) * 1000:.3f} ms each)"
+        )
+    return "\n".join(lines)
+
+
+def add_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Adds the --stats and --profile options to the parser of an entry point (see run).
+
+    :param parser: the parser.
+    :return: None
+    """
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="print the counters and timers of the hot paths to stderr at the end",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="FILE",
+        help="run with cProfile and write a report sorted by cumulative and own time to FILE",
+    )
+
+
+def write_profile_report(profiler, path: str) -> None:
+    """
+    Writes the PROFILE_LINES most expensive functions of a profile,
+    by cumulative time then by own time.
+
+    :param profiler: the cProfile.Profile that ran.
+    :param path: the path of the report.
+    :return: None
+    """
+    import pstats
+
+    with open(path, "w") as file:
+        for sort in ("cumulative", "tottime"):
+            pstats.Stats(profiler, stream=file).strip_dirs().sort_stats(sort).print_stats(
+                PROFILE_LINES
+            )
+
+
+def run(options: argparse.Namespace, function: Callable, *args, **kwargs):
+    """
+    Runs the main function of an entry point, with the statistics enabled if --stats
+    was given, and with cProfile if --profile was given.
+
+    :param options: the parsed arguments, with the options of add_arguments.
+    :param function: the function.
+    :param args: the positional arguments of the function.
+    :param kwargs: the keyword arguments of the function.
+    :return: the result of the function.
+    """
+    if options.stats:
+        enable()
+
+    profiler = None
+    if options.profile:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        return function(*args, **kwargs)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            write_profile_report(profiler, options.profile)
+            print(f"Profile written to {options.profile}", file=sys.stderr)
+        if options.stats:
+            print(format_stats(), file=sys.stderr)
@@ -0,0 +1,93 @@
+import csv
+import os
+import sys
+
+import pytest
+
+# the modules of the project are at the root of the repository
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from city import City, CityStore  # noqa: E402
+from country import Country  # noqa: E402
+from csv_parsing import load_city_columns  # noqa: E402
+import travel_tables  # noqa: E402
+
+CSV_PATH = os.path.join(ROOT, "worldcities_truncated.csv")
+
+# the small world keeps one row of the CSV file out of this many
+SMALL_WORLD_STEP = 5
+
+
+def reset_registries() -> None:
+    """
+    Forgets all the cities and countries. The registry versions keep increasing,
+    so that every cache built from the old registries is rebuilt.
+
+    :return: None
+    """
+    # cleared in place, since path_finding keeps a view of id_to_cities
+    City.id_to_cities.clear()
+    City.name_to_cities.clear()
+    City.store = CityStore()
+    City.distance_matrix = None
+    City.registry_version += 1
+
+    Country.name_to_countries.clear()
+    Country.countries_and_their_cities.clear()
+    Country.city_id_to_country.clear()
+    Country.registry_version += 1
+
+    travel_tables.loaded_tables.clear()
+
+
+def write_small_csv(path: str) -> None:
+    """
+    Writes one row of worldcities_truncated.csv out of SMALL_WORLD_STEP to a CSV file.
+
+    :param path: the path of the new CSV file.
+    :return: None
+    """
+    with open(CSV_PATH, newline="", encoding="utf-8") as source:
+        rows = list(csv.reader(source))
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        csv.writer(file).writerows([rows[0]] + rows[1::SMALL_WORLD_STEP])
+
+
+@pytest.fixture
+def world() -> list[City]:
+    """
+    Creates the cities and countries of worldcities_truncated.csv, and only them.
+
+    :return: the cities, in the order of the file.
+    """
+    reset_registries()
+    load_city_columns(CSV_PATH).create_cities_countries()
+    yield list(City.id_to_cities.values())
+    reset_registries()
+
+
+@pytest.fixture
+def small_csv(tmp_path) -> str:
+    """
+    Writes the CSV file of the small world (see write_small_csv).
+
+    :return: the path of the CSV file.
+    """
+    path = str(tmp_path / "small_world.csv")
+    write_small_csv(path)
+    return path
+
+
+@pytest.fixture
+def small_world(small_csv) -> list[City]:
+    """
+    Creates the cities and countries of one row of worldcities_truncated.csv out of
+    SMALL_WORLD_STEP, and only them, so that every pair of cities can be looked at.
+
+    :return: the cities, in the order of the file.
+    """
+    reset_registries()
+    load_city_columns(small_csv).create_cities_countries()
+    yield list(City.id_to_cities.values())
+    reset_registries()
@@ -0,0 +1,84 @@
+import math
+import random
+
+import numpy as np
+from geopy.distance import great_circle
+
+from city import City, get_distance_matrix
+from distance_matrix import DistanceMatrix, ceil_great_circle_km
+
+
+def geopy_distance(departure: City, arrival: City) -> int:
+    """
+    Returns the distance City.distance computed before the distance matrix existed.
+
+    :param departure: the first city.
+    :param arrival: the second city.
+    :return: the rounded-up distance in kilometers.
+    """
+    return math.ceil(great_circle(departure.coordinates, arrival.coordinates).km)
+
+
+def test_ceil_great_circle_km_matches_geopy():
+    generator = random.Random(0)
+    points = [(generator.uniform(-90, 90), generator.uniform(-180, 180)) for _ in range(2000)]
+    # same points, antipodes and points on integer kilometers are the hard cases
+    points += [(0, 0), (0, 180), (90, 0), (-90, 0), (0, 0.0089932036), (45, -179.9999)]
+    latitudes = np.array([point[0] for point in points])
+    longitudes = np.array([point[1] for point in points])
+
+    first, second = np.arange(len(points)), np.roll(np.arange(len(points)), 1)
+    distances = ceil_great_circle_km(
+        latitudes[first], longitudes[first], latitudes[second], longitudes[second]
+    )
+
+    expected = [
+        math.ceil(great_circle(points[i], points[j]).km) for i, j in zip(first, second)
+    ]
+    assert distances.tolist() == expected
+
+
+def test_distance_matrix_matches_geopy(small_world):
+    matrix = DistanceMatrix(small_world)
+
+    for i, departure in enumerate(small_world):
+        for j, arrival in enumerate(small_world):
+            assert matrix.distances[i, j] == geopy_distance(departure, arrival)
+
+
+def test_city_distance_does_not_build_the_matrix(world):
+    departure, arrival = world[0], world[-1]
+
+    assert departure.distance(arrival) == geopy_distance(departure, arrival)
+    assert City.distance_matrix is None
+
+
+def test_city_distance_uses_the_matrix(small_world):
+    matrix = get_distance_matrix()
+    departure, arrival = small_world[3], small_world[7]
+
+    assert City.distance_matrix is matrix
+    assert departure.distance(arrival) == geopy_distance(departure, arrival)
+
+
+def test_added_cities_extend_the_matrix(small_world):
+    get_distance_matrix()
+    added = [City("Added " + str(index), (index, -index), "", 1, -1 - index) for index in range(5)]
+
+    matrix = get_distance_matrix()
+    fresh = DistanceMatrix(list(City.id_to_cities.values()))
+
+    assert matrix.cities == small_world + added
+    assert np.array_equal(matrix.distances, fresh.distances)
+
+
+def test_moved_city_drops_the_matrix(small_world):
+    get_distance_matrix()
+    version = City.registry_version
+    departure, arrival = small_world[0], small_world[1]
+
+    departure.coordinates = (-arrival.coordinates[0], arrival.coordinates[1] - 179)
+
+    assert City.distance_matrix is None
+    assert City.registry_version > version
+    assert departure.distance(arrival) == geopy_distance(departure, arrival)
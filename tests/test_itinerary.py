@@ -0,0 +1,87 @@
+import pickle
+
+import pytest
+
+from city import City
+from itinerary import Itinerary
+
+
+def expected_distance(cities: list[City]) -> int:
+    """
+    Returns the total distance of cities computed leg by leg, as Itinerary did at first.
+
+    :param cities: the cities, in order.
+    :return: the total distance in km.
+    """
+    return sum(departure.distance(arrival) for departure, arrival in zip(cities, cities[1:]))
+
+
+# changes of the list of cities made without the methods of the itinerary
+CHANGES = {
+    "append": lambda cities, others: cities.append(others[0]),
+    "extend": lambda cities, others: cities.extend(others[:3]),
+    "insert": lambda cities, others: cities.insert(2, others[0]),
+    "pop": lambda cities, others: cities.pop(),
+    "pop_first": lambda cities, others: cities.pop(0),
+    "remove": lambda cities, others: cities.remove(cities[1]),
+    "setitem": lambda cities, others: cities.__setitem__(0, others[0]),
+    "set_slice": lambda cities, others: cities.__setitem__(slice(1, 3), others[:4]),
+    "delitem": lambda cities, others: cities.__delitem__(1),
+    "del_slice": lambda cities, others: cities.__delitem__(slice(1, 3)),
+    "iadd": lambda cities, others: cities.__iadd__(others[:2]),
+    "reverse": lambda cities, others: cities.reverse(),
+    "sort": lambda cities, others: cities.sort(key=lambda city: city.name),
+    "clear": lambda cities, others: cities.clear(),
+}
+
+
+@pytest.mark.parametrize("change", CHANGES)
+def test_total_distance_follows_changes_of_the_cities(world, change):
+    itinerary = Itinerary(world[:10])
+    itinerary.total_distance()
+
+    CHANGES[change](itinerary.cities, world[100:110])
+
+    assert itinerary.total_distance() == expected_distance(list(itinerary.cities))
+
+
+def test_total_distance_follows_the_methods(world):
+    itinerary = Itinerary(world[:2])
+
+    itinerary.append_city(world[20])
+    assert itinerary.total_distance() == expected_distance(list(itinerary.cities))
+    for city in world[30:60]:
+        itinerary.min_distance_insert_city(city)
+        assert itinerary.total_distance() == expected_distance(list(itinerary.cities))
+
+    itinerary.optimize(time_budget=0.05)
+    assert itinerary.total_distance() == expected_distance(list(itinerary.cities))
+
+
+def test_itinerary_copies_the_cities(world):
+    cities = world[:5]
+    itinerary = Itinerary(cities)
+
+    cities.append(world[50])
+
+    assert itinerary.cities == world[:5]
+    assert itinerary.total_distance() == expected_distance(world[:5])
+
+
+def test_replaced_cities_are_measured_again(world):
+    itinerary = Itinerary(world[:5])
+    itinerary.total_distance()
+
+    itinerary.cities = world[5:12]
+
+    assert itinerary.total_distance() == expected_distance(world[5:12])
+
+
+def test_pickled_itinerary_keeps_its_distance(world):
+    itinerary = Itinerary(world[:8])
+    itinerary.total_distance()
+
+    copy = pickle.loads(pickle.dumps(itinerary))
+    copy.cities.append(copy.cities[0])
+
+    assert copy.total_distance() == expected_distance(list(copy.cities))
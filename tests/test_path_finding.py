@@ -0,0 +1,142 @@
+import math
+import random
+
+import networkx
+import pytest
+
+from city import City
+from itinerary import Itinerary
+from path_finding import (
+    find_reachable_cities,
+    find_shortest_path,
+    find_shortest_paths,
+    prepare_search,
+)
+from vehicles import (
+    CrappyCrepeCar,
+    DiplomacyDonutDinghy,
+    TeleportingTarteTrolley,
+    Vehicle,
+)
+
+# the vehicles compared to the flat graph, one for each way of searching paths
+VEHICLES = [
+    CrappyCrepeCar(200),
+    DiplomacyDonutDinghy(100, 500),
+    DiplomacyDonutDinghy(80, 900),
+    TeleportingTarteTrolley(3, 2000),
+    TeleportingTarteTrolley(1, 800),
+]
+
+# the number of (departure, arrival) pairs compared for each vehicle
+PAIRS = 150
+
+
+def flat_graph(vehicle: Vehicle, cities: list[City]) -> networkx.Graph:
+    """
+    Returns the graph of every possible direct trip between the cities,
+    as find_shortest_path built it before A*, routers and spatial indexes.
+
+    :param vehicle: the vehicle.
+    :param cities: the cities.
+    :return: the graph, weighted by the travel times.
+    """
+    graph = networkx.Graph()
+    graph.add_nodes_from(cities)
+    for departure, arrival, travel_time in Vehicle.travel_edges(vehicle, cities):
+        graph.add_edge(departure, arrival, weight=travel_time)
+    return graph
+
+
+def random_pairs(cities: list[City]) -> list[tuple[City, City]]:
+    """
+    Returns PAIRS random pairs of cities, always the same ones.
+
+    :param cities: the cities.
+    :return: the (departure, arrival) pairs.
+    """
+    generator = random.Random(0)
+    return [tuple(generator.sample(cities, 2)) for _ in range(PAIRS)]
+
+
+def shortest_time(graph: networkx.Graph, from_city: City, to_city: City) -> float | None:
+    """
+    Returns the travel time of a shortest path on a flat graph, or None if there is no path.
+
+    :param graph: the graph.
+    :param from_city: the departure city.
+    :param to_city: the arrival city.
+    :return: the travel time in hours, or None.
+    """
+    try:
+        return networkx.dijkstra_path_length(graph, from_city, to_city, weight="weight")
+    except networkx.NetworkXNoPath:
+        return None
+
+
+def check_path(
+    vehicle: Vehicle,
+    graph: networkx.Graph,
+    from_city: City,
+    to_city: City,
+    itinerary: Itinerary | None,
+) -> None:
+    """
+    Checks that an itinerary is a shortest path between two cities, or None if there is none.
+
+    :param vehicle: the vehicle.
+    :param graph: the flat graph of the vehicle.
+    :param from_city: the departure city.
+    :param to_city: the arrival city.
+    :param itinerary: the itinerary found.
+    :return: None
+    """
+    expected = shortest_time(graph, from_city, to_city)
+    if expected is None:
+        assert itinerary is None
+        return
+
+    assert itinerary is not None
+    assert itinerary.cities[0] is from_city and itinerary.cities[-1] is to_city
+    hours = vehicle.compute_itinerary_time(itinerary)
+    assert hours != math.inf
+    assert hours == expected
+
+
+@pytest.mark.parametrize("vehicle", VEHICLES, ids=str)
+def test_find_shortest_path_matches_flat_graph(small_world, vehicle):
+    graph = flat_graph(vehicle, small_world)
+    prepare_search(vehicle)
+
+    for from_city, to_city in random_pairs(small_world):
+        itinerary = find_shortest_path(vehicle, from_city, to_city)
+        check_path(vehicle, graph, from_city, to_city, itinerary)
+
+
+@pytest.mark.parametrize("vehicle", VEHICLES, ids=str)
+def test_find_shortest_paths_matches_flat_graph(small_world, vehicle):
+    graph = flat_graph(vehicle, small_world)
+    sources, targets = small_world[:8], small_world[-15:]
+
+    shortest_paths = find_shortest_paths(vehicle, sources, targets)
+
+    assert len(shortest_paths) == len(sources) * len(targets)
+    for (from_city, to_city), itinerary in shortest_paths.items():
+        if from_city is not to_city:
+            check_path(vehicle, graph, from_city, to_city, itinerary)
+
+
+@pytest.mark.parametrize("vehicle", VEHICLES, ids=str)
+def test_find_reachable_cities_matches_flat_graph(small_world, vehicle):
+    graph = flat_graph(vehicle, small_world)
+
+    for from_city in small_world[::10]:
+        reachable = find_reachable_cities(vehicle, from_city)
+        assert set(reachable) == networkx.node_connected_component(graph, from_city)
+
+
+def test_path_to_the_same_city(small_world):
+    for vehicle in VEHICLES:
+        assert find_shortest_path(vehicle, small_world[0], small_world[0]).cities == [
+            small_world[0]
+        ]
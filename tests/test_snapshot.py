@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from city import City, get_distance_matrix
+from conftest import CSV_PATH, reset_registries
+from country import Country, find_country_of_city
+from csv_parsing import SNAPSHOT_SUFFIX, create_cities_countries_from_csv, csv_digest
+from snapshot import load_snapshot, save_snapshot, snapshot_digest
+
+
+def registry_contents() -> tuple:
+    """
+    Returns everything the registries know about the cities and countries.
+
+    :return: the data of the cities, and the cities of each country in order.
+    """
+    cities = [
+        (city.name, city.coordinates, city.city_type, city.population, city.city_id)
+        for city in City.id_to_cities.values()
+    ]
+    countries = {
+        name: (
+            Country.name_to_countries[name].iso3,
+            [city.city_id for city in country_cities],
+        )
+        for name, country_cities in Country.countries_and_their_cities.items()
+    }
+    return cities, countries
+
+
+def test_snapshot_round_trip(small_world, small_csv, tmp_path):
+    get_distance_matrix()
+    distances = City.distance_matrix.distances.copy()
+    contents = registry_contents()
+    path = str(tmp_path / "world.snapshot")
+
+    save_snapshot(path, csv_digest(small_csv))
+    reset_registries()
+    load_snapshot(path)
+
+    assert snapshot_digest(path) == csv_digest(small_csv)
+    assert registry_contents() == contents
+    assert np.array_equal(City.distance_matrix.distances, distances)
+    city = next(iter(City.id_to_cities.values()))
+    assert city in Country.countries_and_their_cities[find_country_of_city(city).name]
+
+
+def test_snapshot_is_loaded_instead_of_the_csv(small_world, small_csv):
+    contents = registry_contents()
+    save_snapshot(small_csv + SNAPSHOT_SUFFIX, csv_digest(small_csv))
+    reset_registries()
+
+    create_cities_countries_from_csv(small_csv)
+
+    assert registry_contents() == contents
+
+
+@pytest.mark.parametrize("size", [0, 6, 20, 300, 5000, -64])
+def test_unreadable_snapshot_falls_back_to_the_csv(small_world, small_csv, tmp_path, size):
+    contents = registry_contents()
+    path = str(tmp_path / "world.snapshot")
+    save_snapshot(path, csv_digest(small_csv))
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(small_csv + SNAPSHOT_SUFFIX, "wb") as file:
+        file.write(data[:size])
+    reset_registries()
+
+    create_cities_countries_from_csv(small_csv)
+
+    assert registry_contents() == contents
+
+
+def test_snapshot_of_another_version_falls_back_to_the_csv(small_world, small_csv, tmp_path):
+    contents = registry_contents()
+    path = str(tmp_path / "world.snapshot")
+    save_snapshot(path, csv_digest(small_csv))
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(small_csv + SNAPSHOT_SUFFIX, "wb") as file:
+        file.write(b"VTSNAP00" + data[8:])
+    reset_registries()
+
+    create_cities_countries_from_csv(small_csv)
+
+    assert registry_contents() == contents
+
+
+def test_snapshot_of_another_csv_is_ignored(world, small_csv):
+    # a snapshot of all the cities, next to the CSV file of the small world
+    save_snapshot(small_csv + SNAPSHOT_SUFFIX, csv_digest(CSV_PATH))
+    reset_registries()
+
+    create_cities_countries_from_csv(small_csv)
+
+    assert len(City.id_to_cities) < len(world)
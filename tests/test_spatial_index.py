@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from distance_matrix import DistanceMatrix
+from spatial_index import SpatialIndex
+from vehicles import TeleportingTarteTrolley, Vehicle
+
+
+@pytest.mark.parametrize("radius_km", [-3, 0, 0.01, 10, 150, 2000, 9000, 20100])
+def test_indexes_within_matches_brute_force(world, radius_km):
+    index = SpatialIndex(world, 500)
+    # the distances of the matrix are the ones of City.distance (see test_distance_matrix)
+    distances = DistanceMatrix(world).distances
+
+    for center in range(len(world)):
+        expected = np.nonzero(distances[center] <= radius_km)[0]
+        assert index.indexes_within(center, radius_km).tolist() == expected.tolist()
+
+
+def test_cities_within_includes_the_city(world):
+    index = SpatialIndex(world, 100)
+
+    assert world[0] in index.cities_within(world[0], 0)
+
+
+@pytest.mark.parametrize("max_distance", [0, 300, 2000, 20100])
+def test_trolley_travel_edges_match_all_pairs(small_world, max_distance):
+    trolley = TeleportingTarteTrolley(3, max_distance)
+
+    edges = trolley.travel_edges(small_world)
+    # the edges of Vehicle look at every pair of cities
+    expected = Vehicle.travel_edges(trolley, small_world)
+
+    assert edges == expected
@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+from city import City
+from path_finding import find_shortest_path, find_shortest_paths
+from test_path_finding import VEHICLES, check_path, flat_graph, random_pairs, shortest_time
+from travel_tables import get_travel_table, load_travel_tables
+
+
+@pytest.mark.parametrize("vehicle", VEHICLES, ids=str)
+def test_travel_table_matches_flat_graph(small_world, small_csv, tmp_path, vehicle):
+    graph = flat_graph(vehicle, small_world)
+    load_travel_tables([vehicle], small_csv, str(tmp_path))
+    table = get_travel_table(vehicle)
+
+    for from_city, to_city in random_pairs(small_world):
+        expected = shortest_time(graph, from_city, to_city)
+        assert table.travel_time(from_city, to_city) == (
+            math.inf if expected is None else expected
+        )
+        itinerary = find_shortest_path(vehicle, from_city, to_city)
+        check_path(vehicle, graph, from_city, to_city, itinerary)
+
+    sources, targets = small_world[:5], small_world[-5:]
+    for (from_city, to_city), itinerary in find_shortest_paths(vehicle, sources, targets).items():
+        check_path(vehicle, graph, from_city, to_city, itinerary)
+
+
+def test_saved_travel_table_is_loaded(small_world, small_csv, tmp_path):
+    vehicle = VEHICLES[-1]
+    load_travel_tables([vehicle], small_csv, str(tmp_path))
+    computed = get_travel_table(vehicle)
+
+    load_travel_tables([vehicle], small_csv, str(tmp_path))
+    loaded = get_travel_table(vehicle)
+
+    assert loaded is not computed
+    assert (loaded.travel_times == computed.travel_times).all()
+
+
+def test_added_city_invalidates_travel_table(small_world, small_csv, tmp_path):
+    vehicle = VEHICLES[-1]
+    load_travel_tables([vehicle], small_csv, str(tmp_path))
+
+    City("Added", (0, 0), "", 1, -1)
+
+    assert get_travel_table(vehicle) is None
+
+
+def test_travel_table_of_other_cities_is_not_loaded(small_world, small_csv, tmp_path):
+    vehicle = VEHICLES[-1]
+    load_travel_tables([vehicle], small_csv, str(tmp_path))
+
+    City("Added", (0, 0), "", 1, -1)
+    load_travel_tables([vehicle], small_csv, str(tmp_path))
+
+    assert get_travel_table(vehicle) is None
@@ -0,0 +1,334 @@
+import random
+import time
+from collections import deque
+import numpy as np
+
+# number of nearest cities considered when looking for a better place for a city
+DEFAULT_NEIGHBOURS = 8
+
+# time in seconds spent improving a tour by default
+DEFAULT_TIME_BUDGET = 2.0
+
+# maximum number of cities moved at once by an Or-opt move
+MAX_SEGMENT_LENGTH = 3
+
+# maximum length of the sequences swapped when kicking the tour out of a local optimum
+MAX_KICK_LENGTH = 50
+
+# minimum time in seconds between two entries of the history of an optimization
+HISTORY_INTERVAL = 0.05
+
+
+def nearest_neighbours(distances: np.ndarray, count: int) -> list[list[int]]:
+    """
+    Returns the closest cities to each city, from the closest to the farthest.
+
+    :param distances: distances[i, j] is the distance between cities i and j.
+    :param count: the number of neighbours of each city.
+    :return: the indexes of the neighbours of each city, without the city itself.
+    """
+    size = len(distances)
+    count = min(count, size - 1)
+    if count <= 0:
+        return [[] for _ in range(size)]
+
+    closest = np.argpartition(distances, count, axis=1)[:, : count + 1]
+    closest_distances = np.take_along_axis(distances, closest, axis=1)
+    closest = np.take_along_axis(closest, np.argsort(closest_distances, axis=1), axis=1)
+
+    return [
+        [other for other in row if other != index][:count]
+        for index, row in enumerate(closest.tolist())
+    ]
+
+
+def path_length(distances: list[list[int]], tour: list[int]) -> int:
+    """
+    Returns the sum of the distances between successive cities of a tour.
+
+    :param distances: distances[i][j] is the distance between cities i and j.
+    :param tour: the indexes of the cities, in the order they are visited.
+    :return: the length of the tour.
+    """
+    return sum(distances[tour[index]][tour[index + 1]] for index in range(len(tour) - 1))
+
+
+class TourOptimizer:
+    """
+    Improves an open tour with a fixed first city, using 2-opt moves (reversing a part of the tour)
+    and Or-opt moves (moving up to MAX_SEGMENT_LENGTH successive cities elsewhere),
+    only trying to bring a city next to one of its nearest neighbours.
+    When no move improves the tour, a part of it is shuffled and improved again,
+    keeping the result if it is shorter.
+
+    The end of the tour is free: a last, fake city at distance 0 of all the others
+    is added so that every city has a successor.
+    """
+
+    def __init__(self, distances: np.ndarray, neighbours: int = DEFAULT_NEIGHBOURS) -> None:
+        """
+        Prepares the optimization of tours of the given cities.
+
+        :param distances: distances[i, j] is the (integer) distance between cities i and j.
+        :param neighbours: the number of neighbours of each city that moves try.
+        :return: None
+        """
+        self.size = len(distances)
+        self.candidates = nearest_neighbours(distances, neighbours)
+
+        # the fake last city has index self.size
+        self.distances = [row + [0] for row in distances.tolist()]
+        self.distances.append([0] * (self.size + 1))
+
+        self.tour = []
+        self.position = [0] * (self.size + 1)
+        self.queue = deque()
+        self.queued = [False] * (self.size + 1)
+
+    def set_tour(self, tour: list[int]) -> None:
+        """
+        Makes a tour the current tour, and marks all its cities as to be improved.
+
+        :param tour: the indexes of the cities, fake last city included.
+        :return: None
+        """
+        self.tour = list(tour)
+        self.update_positions(0, len(self.tour))
+        self.queue.clear()
+        self.queued = [False] * (self.size + 1)
+        for city in self.tour[:-1]:
+            self.push(city)
+
+    def update_positions(self, start: int, stop: int) -> None:
+        """
+        Updates the positions of the cities between two positions of the tour after they moved.
+
+        :param start: the first position that changed.
+        :param stop: the position after the last one that changed.
+        :return: None
+        """
+        for position in range(start, stop):
+            self.position[self.tour[position]] = position
+
+    def push(self, city: int) -> None:
+        """
+        Marks a city as to be improved, i.e. its surroundings changed since it was last looked at.
+
+        :param city: the index of the city.
+        :return: None
+        """
+        if city != self.size and not self.queued[city]:
+            self.queued[city] = True
+            self.queue.append(city)
+
+    def reverse(self, start: int, stop: int) -> None:
+        """
+        Reverses the part of the tour between two positions.
+
+        :param start: the first position of the part.
+        :param stop: the last position of the part.
+        :return: None
+        """
+        self.tour[start : stop + 1] = self.tour[start : stop + 1][::-1]
+        self.update_positions(start, stop + 1)
+
+    def two_opt(self, city: int) -> bool:
+        """
+        Applies the first 2-opt move found that brings the city next to one of its neighbours
+        and shortens the tour.
+        Replacing the edges (t[i], t[i + 1]) and (t[j], t[j + 1]) by (t[i], t[j]) and
+        (t[i + 1], t[j + 1]) reverses the tour from i + 1 to j.
+
+        :param city: the index of the city.
+        :return: whether the tour was changed.
+        """
+        distance = self.distances
+        tour, position = self.tour, self.position
+        city_position = position[city]
+
+        # the move replaces either the edge to the next city or the edge to the previous city
+        for step in (1, -1):
+            if step == -1 and city_position == 0:
+                continue
+            city_next = tour[city_position + step]
+            removed = distance[city][city_next]
+
+            for neighbour in self.candidates[city]:
+                partial_gain = removed - distance[city][neighbour]
+                if partial_gain <= 0:
+                    break
+                neighbour_position = position[neighbour]
+                if step == -1 and neighbour_position == 0:
+                    continue
+                neighbour_next = tour[neighbour_position + step]
+
+                gain = (
+                    partial_gain
+                    + distance[neighbour][neighbour_next]
+                    - distance[city_next][neighbour_next]
+                )
+                if gain <= 0:
+                    continue
+
+                if step == 1:
+                    start, stop = sorted((city_position, neighbour_position))
+                else:
+                    start, stop = sorted((city_position - 1, neighbour_position - 1))
+                if stop - start < 2:
+                    continue
+
+                self.reverse(start + 1, stop)
+                for moved in (city, city_next, neighbour, neighbour_next):
+                    self.push(moved)
+                return True
+
+        return False
+
+    def or_opt(self, city: int) -> bool:
+        """
+        Applies the first Or-opt move found that moves a sequence of cities starting or ending
+        with the city next to a neighbour of one of its ends (possibly reversed),
+        and shortens the tour.
+
+        :param city: the index of the city.
+        :return: whether the tour was changed.
+        """
+        distance = self.distances
+        tour, position = self.tour, self.position
+        city_position = position[city]
+        if city_position == 0:
+            return False
+
+        for length in range(1, MAX_SEGMENT_LENGTH + 1):
+            for start in (city_position, city_position - length + 1):
+                stop = start + length - 1
+                if start < 1 or stop >= len(tour) - 1:
+                    continue
+
+                first, last = tour[start], tour[stop]
+                before, after = tour[start - 1], tour[stop + 1]
+                removal_gain = (
+                    distance[before][first]
+                    + distance[last][after]
+                    - distance[before][after]
+                )
+                if removal_gain <= 0:
+                    continue
+
+                for end in (first, last):
+                    for neighbour in self.candidates[end]:
+                        if distance[end][neighbour] >= removal_gain:
+                            break
+                        neighbour_position = position[neighbour]
+                        if start <= neighbour_position <= stop:
+                            continue
+
+                        # the sequence goes either after or before the neighbour
+                        for previous_position in (neighbour_position, neighbour_position - 1):
+                            if previous_position < 0 or start - 1 <= previous_position <= stop:
+                                continue
+                            previous = tour[previous_position]
+                            next_city = tour[previous_position + 1]
+                            replaced = distance[previous][next_city]
+
+                            forward = distance[previous][first] + distance[last][next_city]
+                            backward = distance[previous][last] + distance[first][next_city]
+                            if removal_gain - min(forward, backward) + replaced <= 0:
+                                continue
+
+                            sequence = tour[start : stop + 1]
+                            if backward < forward:
+                                sequence.reverse()
+                            if previous_position < start:
+                                tour[previous_position + 1 : stop + 1] = (
+                                    sequence + tour[previous_position + 1 : start]
+                                )
+                                self.update_positions(previous_position + 1, stop + 1)
+                            else:
+                                tour[start : previous_position + 1] = (
+                                    tour[stop + 1 : previous_position + 1] + sequence
+                                )
+                                self.update_positions(start, previous_position + 1)
+
+                            for moved in (first, last, before, after, previous, next_city):
+                                self.push(moved)
+                            return True
+
+        return False
+
+    def local_search(self, deadline: float) -> None:
+        """
+        Applies moves until none improves the tour, or until the deadline.
+
+        :param deadline: the time (from time.perf_counter) when the search stops.
+        :return: None
+        """
+        while self.queue and time.perf_counter() < deadline:
+            city = self.queue.popleft()
+            self.queued[city] = False
+            if self.two_opt(city) or self.or_opt(city):
+                self.push(city)
+
+    def kick(self, generator: random.Random) -> None:
+        """
+        Swaps two successive parts of the tour (a double bridge move), so that the search
+        can leave a local optimum.
+
+        :param generator: the random number generator choosing the parts.
+        :return: None
+        """
+        tour = self.tour
+        first = generator.randint(1, self.size - 2)
+        second = min(first + generator.randint(1, MAX_KICK_LENGTH), self.size - 1)
+        third = min(second + generator.randint(1, MAX_KICK_LENGTH), self.size)
+
+        tour[first:third] = tour[second:third] + tour[first:second]
+        self.update_positions(first, third)
+        for position in (first - 1, first, second - 1, second, third - 1, third):
+            self.push(tour[min(position, self.size)])
+
+    def optimize(
+        self,
+        tour: list[int],
+        time_budget: float = DEFAULT_TIME_BUDGET,
+        seed: int = 0,
+    ) -> tuple[list[int], list[tuple[float, int]]]:
+        """
+        Improves a tour for the given time.
+
+        :param tour: the indexes of the cities, in the order they are visited. The first one stays first.
+        :param time_budget: the time to spend in seconds.
+        :param seed: the seed of the random kicks.
+        :return: the best tour found, and the length of the best tour over time
+                 as a list of (seconds since the start, length).
+        """
+        start_time = time.perf_counter()
+        deadline = start_time + time_budget
+        generator = random.Random(seed)
+
+        best_tour = list(tour) + [self.size]
+        best_length = path_length(self.distances, best_tour)
+        history = [(0.0, best_length)]
+        if self.size < 4:
+            return best_tour[:-1], history
+
+        self.set_tour(best_tour)
+        while True:
+            self.local_search(deadline)
+            length = path_length(self.distances, self.tour)
+
+            if length < best_length:
+                best_tour, best_length = list(self.tour), length
+                elapsed = time.perf_counter() - start_time
+                if elapsed - history[-1][0] >= HISTORY_INTERVAL:
+                    history.append((elapsed, best_length))
+            elif length > best_length:
+                self.tour[:] = best_tour
+                self.update_positions(0, len(best_tour))
+
+            if time.perf_counter() >= deadline:
+                break
+            self.kick(generator)
+
+        history.append((time.perf_counter() - start_time, best_length))
+        return best_tour[:-1], history
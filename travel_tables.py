@@ -0,0 +1,229 @@
+import hashlib
+import math
+import os
+import time
+import numpy as np
+
+from city import City, get_city_by_id
+from country import Country
+from itinerary import Itinerary
+from vehicles import Vehicle, create_example_vehicles
+from csv_parsing import create_cities_countries_from_csv, csv_digest
+
+# the directory where the tables are saved by default
+TABLES_DIRECTORY = "travel_tables"
+
+# marks a city without predecessor in the predecessor table
+NO_PREDECESSOR = -1
+
+# associates the parameters of a vehicle (see vehicle_parameters) to its loaded TravelTable
+loaded_tables = dict()
+
+
+class TravelTable:
+    """
+    The shortest travel time between every pair of cities for a vehicle,
+    along with the last city before the arrival on a shortest path.
+    """
+
+    def __init__(
+        self, city_ids: np.ndarray, travel_times: np.ndarray, predecessors: np.ndarray
+    ) -> None:
+        """
+        Creates a table from its arrays.
+
+        :param city_ids: the IDs of the cities, giving the order of the rows and columns.
+        :param travel_times: travel_times[i, j] is the shortest travel time in hours
+                             from city i to city j, or math.inf if there is no path.
+        :param predecessors: predecessors[i, j] is the index of the city before city j
+                             on a shortest path from city i, or NO_PREDECESSOR if there is none.
+        :return: None
+        """
+        self.city_ids = city_ids
+        self.travel_times = travel_times
+        self.predecessors = predecessors
+        self.id_to_index = {int(city_id): index for index, city_id in enumerate(city_ids)}
+
+        # the versions of the city and country registries the table is valid for
+        self.version = None
+
+    def travel_time(self, from_city: City, to_city: City) -> float:
+        """
+        Returns the shortest travel time in hours between two cities.
+
+        :param from_city: The departure city.
+        :param to_city: The arrival city.
+        :return: the travel time in hours, or math.inf if there is no path.
+        """
+        return float(
+            self.travel_times[
+                self.id_to_index[from_city.city_id], self.id_to_index[to_city.city_id]
+            ]
+        )
+
+    def itinerary(self, from_city: City, to_city: City) -> Itinerary | None:
+        """
+        Returns a shortest path between two cities as an Itinerary, or None if there is no path.
+        The path is read backwards from the predecessor table, one city at a time.
+
+        :param from_city: The departure city.
+        :param to_city: The arrival city.
+        :return: A shortest path from departure to arrival, or None if there is none.
+        """
+        from_index = self.id_to_index[from_city.city_id]
+        to_index = self.id_to_index[to_city.city_id]
+        if self.travel_times[from_index, to_index] == math.inf:
+            return None
+
+        path = [to_city]
+        index = to_index
+        while index != from_index:
+            index = int(self.predecessors[from_index, index])
+            path.append(get_city_by_id(int(self.city_ids[index])))
+        path.reverse()
+
+        return Itinerary(path)
+
+
+def vehicle_parameters(vehicle: Vehicle) -> str:
+    """
+    Returns a string describing the type of a vehicle and its parameters (e.g. its speed),
+    which is the same for two identical vehicles.
+
+    :param vehicle: The vehicle.
+    :return: The description of the vehicle.
+    """
+    parameters = ",".join(
+        f"{name}={value}" for name, value in sorted(vars(vehicle).items())
+    )
+    return type(vehicle).__name__ + "(" + parameters + ")"
+
+
+def table_key(digest: str, vehicle: Vehicle) -> str:
+    """
+    Returns the name under which the table of a vehicle for a CSV file is saved.
+
+    :param digest: The digest of the CSV file the cities were read from (see csv_digest).
+    :param vehicle: The vehicle.
+    :return: A hash of the content of the CSV file and the parameters of the vehicle.
+    """
+    content = digest + "|" + vehicle_parameters(vehicle)
+    return hashlib.sha256(content.encode()).hexdigest()[:20]
+
+
+def compute_travel_table(vehicle: Vehicle) -> TravelTable:
+    """
+    Computes the shortest travel times between all the known cities for a vehicle
+    (using the Floyd-Warshall algorithm on the matrix of direct travel times).
+
+    :param vehicle: The vehicle to use.
+    :return: The table of the vehicle.
+    """
+    cities = list(City.id_to_cities.values())
+    size = len(cities)
+    index_of = {city: index for index, city in enumerate(cities)}
+
+    travel_times = np.full((size, size), math.inf)
+    predecessors = np.full((size, size), NO_PREDECESSOR, dtype=np.int32)
+    for departure, arrival, travel_time in vehicle.travel_edges(cities):
+        departure_index, arrival_index = index_of[departure], index_of[arrival]
+        travel_times[departure_index, arrival_index] = travel_time
+        travel_times[arrival_index, departure_index] = travel_time
+        predecessors[departure_index, arrival_index] = departure_index
+        predecessors[arrival_index, departure_index] = arrival_index
+    np.fill_diagonal(travel_times, 0)
+
+    # a path only replaces the known one if it is strictly shorter
+    for middle in range(size):
+        through_middle = travel_times[:, middle, np.newaxis] + travel_times[middle, :]
+        shorter = through_middle < travel_times
+        np.minimum(travel_times, through_middle, out=travel_times)
+        np.copyto(predecessors, predecessors[middle, :], where=shorter)
+
+    city_ids = np.array([city.city_id for city in cities], dtype=np.int64)
+    return TravelTable(city_ids, travel_times.astype(np.float32), predecessors)
+
+
+def save_travel_table(table: TravelTable, path: str) -> None:
+    """
+    Saves a table as three .npy files starting with the given path.
+
+    :param table: The table to save.
+    :param path: The path of the files, without the suffixes.
+    :return: None
+    """
+    np.save(path + "_ids.npy", table.city_ids)
+    np.save(path + "_times.npy", table.travel_times)
+    np.save(path + "_predecessors.npy", table.predecessors)
+
+
+def load_travel_table(path: str) -> TravelTable:
+    """
+    Loads a table saved by save_travel_table. The arrays are memory-mapped, not read.
+
+    :param path: The path of the files, without the suffixes.
+    :return: The table.
+    """
+    return TravelTable(
+        np.load(path + "_ids.npy"),
+        np.load(path + "_times.npy", mmap_mode="r"),
+        np.load(path + "_predecessors.npy", mmap_mode="r"),
+    )
+
+
+def load_travel_tables(
+    vehicles: list[Vehicle], path_to_csv: str, directory: str = TABLES_DIRECTORY
+) -> None:
+    """
+    Makes the tables of the given vehicles available to find_shortest_path and find_shortest_paths.
+    The tables saved for the same CSV file and vehicle parameters are loaded,
+    the others are computed and saved.
+    The cities of the CSV file must have been created, and no other city:
+    a saved table of other cities is not made available.
+
+    :param vehicles: The vehicles.
+    :param path_to_csv: The path to the CSV file the cities were read from.
+    :param directory: The directory where the tables are saved.
+    :return: None
+    """
+    os.makedirs(directory, exist_ok=True)
+    digest = csv_digest(path_to_csv)
+
+    for vehicle in vehicles:
+        path = os.path.join(directory, table_key(digest, vehicle))
+        if os.path.exists(path + "_predecessors.npy"):
+            table = load_travel_table(path)
+            if set(table.city_ids.tolist()) != City.id_to_cities.keys():
+                continue
+        else:
+            table = compute_travel_table(vehicle)
+            save_travel_table(table, path)
+
+        table.version = (City.registry_version, Country.registry_version)
+        loaded_tables[vehicle_parameters(vehicle)] = table
+
+
+def get_travel_table(vehicle: Vehicle) -> TravelTable | None:
+    """
+    Returns the loaded table of a vehicle, or None if there is none
+    or if cities were added since it was loaded.
+
+    :param vehicle: The vehicle.
+    :return: The table of the vehicle, or None.
+    """
+    table = loaded_tables.get(vehicle_parameters(vehicle))
+    if table is None or table.version != (
+        City.registry_version,
+        Country.registry_version,
+    ):
+        return None
+    return table
+
+
+if __name__ == "__main__":
+    create_cities_countries_from_csv("worldcities_truncated.csv")
+
+    for vehicle in create_example_vehicles():
+        start = time.perf_counter()
+        load_travel_tables([vehicle], "worldcities_truncated.csv")
+        print(f"Table of {vehicle} ready in {time.perf_counter() - start:.2f} s")
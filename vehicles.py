@@ -1,8 +1,82 @@
 import math
 from abc import ABC, abstractmethod
+import numpy as np
 from city import City, get_city_by_id, get_cities_by_name
 from country import Country, find_country_of_city, create_example_countries
+from distance_matrix import ceil_great_circle_km
 from itinerary import Itinerary
+from spatial_index import SpatialIndex
+
+# the country code of the cities that are in no country (see Legs)
+NO_COUNTRY = -1
+
+
+class Legs:
+    """
+    The legs (trips between successive cities) of many itineraries,
+    with the data needed to compute their travel times stored as arrays with one element per leg.
+    """
+
+    def __init__(self, itineraries: list[Itinerary | None]) -> None:
+        """
+        Collects the legs of the given itineraries, one itinerary after the other.
+
+        :param itineraries: the itineraries. None is an itinerary without legs.
+        :return: None
+        """
+        self.departures = []
+        self.arrivals = []
+        itinerary_indexes = []
+        for itinerary_index, itinerary in enumerate(itineraries):
+            if itinerary is not None and len(itinerary.cities) > 1:
+                self.departures.extend(itinerary.cities[:-1])
+                self.arrivals.extend(itinerary.cities[1:])
+                itinerary_indexes.extend([itinerary_index] * (len(itinerary.cities) - 1))
+
+        # the index in the list of itineraries of the itinerary of each leg
+        self.itinerary_indexes = np.array(itinerary_indexes, dtype=np.int64)
+
+        departure_rows = [city.row for city in self.departures]
+        arrival_rows = [city.row for city in self.arrivals]
+        store = City.store
+
+        # the distances in km, rounded up like City.distance
+        self.distances = ceil_great_circle_km(
+            np.frombuffer(store.latitudes)[departure_rows],
+            np.frombuffer(store.longitudes)[departure_rows],
+            np.frombuffer(store.latitudes)[arrival_rows],
+            np.frombuffer(store.longitudes)[arrival_rows],
+        )
+
+        # the city type codes of CityStore
+        self.departure_types = np.frombuffer(store.type_codes, dtype=np.uint16)[departure_rows]
+        self.arrival_types = np.frombuffer(store.type_codes, dtype=np.uint16)[arrival_rows]
+        primary = store.city_type_to_code.get("primary")
+        self.both_primary = (self.departure_types == primary) & (self.arrival_types == primary)
+
+        # the countries are numbered in the order of Country.name_to_countries
+        country_codes = {
+            id(country): code for code, country in enumerate(Country.name_to_countries.values())
+        }
+        self.departure_countries, self.arrival_countries = (
+            np.array(
+                [
+                    country_codes.get(id(find_country_of_city(city)), NO_COUNTRY)
+                    for city in cities
+                ],
+                dtype=np.int64,
+            )
+            for cities in (self.departures, self.arrivals)
+        )
+        self.same_country = (self.departure_countries == self.arrival_countries) & (
+            self.departure_countries != NO_COUNTRY
+        )
+
+    def __len__(self) -> int:
+        """
+        Returns the number of legs.
+        """
+        return len(self.departures)
 
 
 class Vehicle(ABC):
@@ -10,6 +84,14 @@ class Vehicle(ABC):
     A Vehicle defined by a mode of transportation, which results in a specific duration.
     """
 
+    # whether the vehicle can travel directly between any two cities,
+    # in which case its graph is explored lazily instead of being built
+    complete_graph = False
+
+    # whether its shortest paths are found by a HierarchicalRouter (see hierarchical_routing.py)
+    # instead of a graph of all the cities
+    hierarchical = False
+
     @abstractmethod
     def compute_travel_time(self, departure: City, arrival: City) -> float:
         """
@@ -43,6 +125,52 @@ class Vehicle(ABC):
 
         return hours
 
+    def compute_legs_times(self, legs: Legs) -> np.ndarray:
+        """
+        Returns the travel durations of many direct trips at once,
+        identical to compute_travel_time for each of them.
+        Vehicles should override it with a computation on the arrays of the legs.
+
+        :param legs: the trips.
+        :return: the travel time in hours of each trip, or math.inf if the travel is not possible.
+        """
+        return np.array(
+            [
+                self.compute_travel_time(departure, arrival)
+                for departure, arrival in zip(legs.departures, legs.arrivals)
+            ],
+            dtype=float,
+        )
+
+    def travel_time_lower_bound(self, departure: City, arrival: City) -> float:
+        """
+        Returns a duration, in hours, that any trip (direct or not) from one city
+        to another is guaranteed to take at least.
+
+        :param departure: the departure city.
+        :param arrival: the arrival city.
+        :return: a lower bound of the travel time in hours.
+        """
+        return 0
+
+    def travel_edges(self, cities: list[City]) -> list[tuple[City, City, float]]:
+        """
+        Returns the direct trips that are possible between the given cities,
+        as (departure, arrival, travel time) tuples.
+        Each pair of cities appears once, with the departure before the arrival in the list.
+
+        :param cities: the cities.
+        :return: the possible direct trips, in the order of the cities.
+        """
+        edges = []
+        for index, departure in enumerate(cities):
+            for arrival in cities[index + 1 :]:
+                travel_time = self.compute_travel_time(departure, arrival)
+                if travel_time != math.inf:
+                    edges.append((departure, arrival, travel_time))
+
+        return edges
+
     @abstractmethod
     def __str__(self) -> str:
         """
@@ -59,6 +187,8 @@ class CrappyCrepeCar(Vehicle):
         - Can go from any city to any other at a given speed.
     """
 
+    complete_graph = True
+
     def __init__(self, speed: int) -> None:
         """
         Creates a CrappyCrepeCar with a given speed in km/h.
@@ -80,6 +210,28 @@ class CrappyCrepeCar(Vehicle):
         hours = math.ceil(departure.distance(arrival) / self.speed)
         return hours
 
+    def compute_legs_times(self, legs: Legs) -> np.ndarray:
+        """
+        Returns the travel durations of many direct trips at once,
+        identical to compute_travel_time for each of them.
+
+        :param legs: the trips.
+        :return: the travel time in hours of each trip.
+        """
+        return np.ceil(legs.distances / self.speed)
+
+    def travel_time_lower_bound(self, departure: City, arrival: City) -> float:
+        """
+        Returns a duration, in hours, that any trip (direct or not) from one city
+        to another is guaranteed to take at least.
+        No trip is shorter than the direct one, since the distance of each leg is rounded up.
+
+        :param departure: the departure city.
+        :param arrival: the arrival city.
+        :return: a lower bound of the travel time in hours.
+        """
+        return self.compute_travel_time(departure, arrival)
+
     def __str__(self) -> str:
         """
         Returns the class name and the parameters of the vehicle in parentheses.
@@ -98,6 +250,8 @@ class DiplomacyDonutDinghy(Vehicle):
         - Has different speed for the two cases.
     """
 
+    hierarchical = True
+
     def __init__(self, in_country_speed: int, between_primary_speed: int) -> None:
         """
         Creates a DiplomacyDonutDinghy with two given speeds in km/h:
@@ -121,14 +275,36 @@ class DiplomacyDonutDinghy(Vehicle):
         :return: the travel time in hours, rounded up to an integer,
                  or math.inf if the travel is not possible.
         """
-        hours = math.inf
-        for cities in Country.countries_and_their_cities.values():
-            if departure in cities and arrival in cities:
-                hours = math.ceil(departure.distance(arrival) / self.in_country_speed)
-            if departure.city_type == "primary" and arrival.city_type == "primary":
-                hours = math.ceil(
-                    departure.distance(arrival) / self.between_primary_speed
-                )
+        if departure.city_type == "primary" and arrival.city_type == "primary":
+            return math.ceil(departure.distance(arrival) / self.between_primary_speed)
+
+        # both cities must be in the same country otherwise
+        departure_country = find_country_of_city(departure)
+        if departure_country is None or departure_country is not find_country_of_city(
+            arrival
+        ):
+            return math.inf
+
+        return math.ceil(departure.distance(arrival) / self.in_country_speed)
+
+    def compute_legs_times(self, legs: Legs) -> np.ndarray:
+        """
+        Returns the travel durations of many direct trips at once,
+        identical to compute_travel_time for each of them.
+
+        :param legs: the trips.
+        :return: the travel time in hours of each trip, or math.inf if the travel is not possible.
+        """
+        hours = np.full(len(legs), math.inf)
+
+        # a trip between primary cities of the same country is at the speed between primary cities
+        same_country = legs.same_country
+        hours[same_country] = np.ceil(legs.distances[same_country] / self.in_country_speed)
+        both_primary = legs.both_primary
+        hours[both_primary] = np.ceil(
+            legs.distances[both_primary] / self.between_primary_speed
+        )
+
         return hours
 
     def __str__(self) -> str:
@@ -183,6 +359,38 @@ class TeleportingTarteTrolley(Vehicle):
 
         return hours
 
+    def compute_legs_times(self, legs: Legs) -> np.ndarray:
+        """
+        Returns the travel durations of many direct trips at once,
+        identical to compute_travel_time for each of them.
+
+        :param legs: the trips.
+        :return: the travel time in hours of each trip, or math.inf if the travel is not possible.
+        """
+        return np.where(
+            legs.distances <= self.max_distance, math.ceil(self.travel_time), math.inf
+        )
+
+    def travel_edges(self, cities: list[City]) -> list[tuple[City, City, float]]:
+        """
+        Returns the direct trips that are possible between the given cities,
+        as (departure, arrival, travel time) tuples.
+        Only the cities within the maximum distance of each city are looked at.
+
+        :param cities: the cities.
+        :return: the possible direct trips, in the order of the cities.
+        """
+        index = SpatialIndex(cities, self.max_distance)
+        hours = math.ceil(self.travel_time)
+
+        edges = []
+        for departure_index, departure in enumerate(cities):
+            for arrival_index in index.indexes_within(departure_index, self.max_distance):
+                if arrival_index > departure_index:
+                    edges.append((departure, cities[arrival_index], hours))
+
+        return edges
+
     def __str__(self) -> str:
         """
         Returns the class name and the parameters of the vehicle in parentheses.
@@ -200,6 +408,64 @@ class TeleportingTarteTrolley(Vehicle):
         )
 
 
+def compute_itineraries_times(
+    itineraries: list[Itinerary | None], vehicles: list[Vehicle]
+) -> np.ndarray:
+    """
+    Returns the travel duration of every itinerary with every vehicle,
+    identical to Vehicle.compute_itinerary_time but computed for all the legs at once.
+
+    :param itineraries: the itineraries. None is an itinerary without legs, which takes 0 hours.
+    :param vehicles: the vehicles.
+    :return: a matrix whose element [i, j] is the travel time in hours of itinerary i
+             with vehicle j, or math.inf if any leg of the itinerary is not possible.
+    """
+    legs = Legs(itineraries)
+
+    hours = np.zeros((len(itineraries), len(vehicles)))
+    for vehicle_index, vehicle in enumerate(vehicles):
+        hours[:, vehicle_index] = np.bincount(
+            legs.itinerary_indexes,
+            weights=vehicle.compute_legs_times(legs),
+            minlength=len(itineraries),
+        )
+
+    return hours
+
+
+def create_vehicle(spec: dict) -> Vehicle:
+    """
+    Creates a vehicle from a description such as {"type": "CrappyCrepeCar", "speed": 200},
+    where the other keys are the parameters of the constructor of the type.
+    All the parameters (speeds, travel times and distances) must be positive numbers.
+
+    :param spec: the type of the vehicle and its parameters.
+    :return: the vehicle.
+    """
+    vehicle_types = {
+        vehicle_type.__name__: vehicle_type
+        for vehicle_type in (CrappyCrepeCar, DiplomacyDonutDinghy, TeleportingTarteTrolley)
+    }
+    parameters = dict(spec)
+    vehicle_type = vehicle_types.get(parameters.pop("type", None))
+    if vehicle_type is None:
+        raise ValueError("unknown vehicle type in " + str(spec))
+
+    # a speed of 0 would divide by zero, a negative distance would make no sense
+    for name, value in parameters.items():
+        if (
+            isinstance(value, bool)
+            or not isinstance(value, (int, float))
+            or not 0 < value < math.inf
+        ):
+            raise ValueError(f"{name} must be a positive number in " + str(spec))
+
+    try:
+        return vehicle_type(**parameters)
+    except TypeError as error:
+        raise ValueError("invalid vehicle parameters in " + str(spec)) from error
+
+
 def create_example_vehicles() -> list[Vehicle]:
     """
     Creates 3 examples of vehicles.
@@ -236,3 +502,9 @@ if __name__ == "__main__":
                 print(
                     f"\t{vehicle.compute_travel_time(from_city, to_city)} hours with {vehicle}."
                 )
+
+    # we compute the travel times of some itineraries with every vehicle at once
+    itineraries = [
+        Itinerary([from_city, to_city]) for from_city in from_cities for to_city in from_cities
+    ]
+    print(compute_itineraries_times(itineraries, vehicles))